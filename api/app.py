@@ -8,7 +8,7 @@ import sys
 # Add parent directory for imports
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS
 
 app = Flask(__name__)
@@ -17,38 +17,36 @@ CORS(app, origins=["http://localhost:8080", "http://127.0.0.1:8080"])
 _model = None
 _cat_maps = None
 _num_stats = None
+_tiered = None
+_stale_student = False
 
 
 def get_model():
     """Lazy load model and encoders."""
     global _model, _cat_maps, _num_stats
     if _model is None:
-        from risk_prediction_transformer import (
+        from risk_model import (
+            ENCODERS_PATH,
+            MODEL_PATH,
+            CachedContextTabTransformer,
             load_model_and_encoders,
-            load_data,
-            build_encoders,
-            encode_dataframe,
-            train_test_split,
-            train_transformer,
-            save_model_and_encoders,
-            TabTransformer,
-            TabularConfig,
         )
-        import torch
 
-        model_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-            "model_state.pt",
-        )
-        encoders_path = os.path.join(
-            os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-            "encoders.json",
-        )
-
-        if os.path.exists(model_path) and os.path.exists(encoders_path):
-            _model, _cat_maps, _num_stats = load_model_and_encoders()
+        if os.path.exists(MODEL_PATH) and os.path.exists(ENCODERS_PATH):
+            _model, _cat_maps, _num_stats = load_model_and_encoders(cache_cat_context=True)
         else:
-            # Train and save on first run
+            # Train and save on first run; only this path needs the training stack.
+            from risk_prediction_transformer import (
+                load_data,
+                build_encoders,
+                encode_dataframe,
+                train_test_split,
+                train_transformer,
+                save_model_and_encoders,
+                TabTransformer,
+                TabularConfig,
+            )
+
             df = load_data()
             _cat_maps, _num_stats = build_encoders(df)
             x_num, x_cat, y = encode_dataframe(df, _cat_maps, _num_stats)
@@ -81,11 +79,68 @@ def get_model():
                 batch_size=64,
                 lr=1e-3,
             )
-            save_model_and_encoders(_model, _cat_maps, _num_stats)
+            save_model_and_encoders(_model, _cat_maps, _num_stats, n_samples=len(df))
+            _model = CachedContextTabTransformer(_model).eval()
 
     return _model, _cat_maps, _num_stats
 
 
+def get_tiered_predictor():
+    """
+    Lazy load the distilled fast-path student, if one has been saved.
+    A student distilled from a different model is ignored.
+    Set FAST_PATH=0 to always use the transformer.
+    """
+    global _tiered, _stale_student
+    if _tiered is None and not _stale_student and os.environ.get("FAST_PATH", "1") != "0":
+        from distill_student import STUDENT_PATH, TieredPredictor, load_student
+
+        if os.path.exists(STUDENT_PATH):
+            model, _, _ = get_model()
+            try:
+                student, threshold = load_student()
+            except ValueError as e:
+                print(f"Fast path disabled: {e}")
+                _stale_student = True
+                return None
+            threshold = float(os.environ.get("FAST_PATH_THRESHOLD", threshold))
+            _tiered = TieredPredictor(student, model, threshold)
+    return _tiered
+
+
+def warmup():
+    """
+    Load the model(s) and run dummy batches and one dummy prediction so the
+    first real /predict does not pay for lazy loading or first-forward costs.
+    """
+    import time
+
+    from risk_model import predict_from_dict, warmup_model
+
+    start = time.perf_counter()
+    model, cat_maps, num_stats = get_model()
+    tiered = get_tiered_predictor()
+    loaded = time.perf_counter()
+
+    warmup_model(model)
+    dummy = {
+        "Age": 30,
+        "Gender": "Female",
+        "BMI": 22.0,
+        "HemoglobinLevel": 13.0,
+        "IncomeLevel": 50000.0,
+        "Region": "Urban",
+        "HealthHistory": "No",
+    }
+    if tiered is not None:
+        from distill_student import predict_tiered_from_dict
+
+        predict_tiered_from_dict(tiered, cat_maps, num_stats, dummy)
+    predict_from_dict(model, cat_maps, num_stats, dummy)
+    done = time.perf_counter()
+    print(f"Model loaded in {loaded - start:.2f}s, warmed up in {done - loaded:.2f}s")
+
+
 @app.route("/health", methods=["GET"])
 def health():
     return jsonify({"status": "ok"})
@@ -123,15 +178,63 @@ def predict():
         }
 
         model, cat_maps, num_stats = get_model()
-        from risk_prediction_transformer import predict_from_dict
+        tiered = get_tiered_predictor()
+        if tiered is not None:
+            from distill_student import predict_tiered_from_dict
 
-        result = predict_from_dict(model, cat_maps, num_stats, user)
+            result = predict_tiered_from_dict(tiered, cat_maps, num_stats, user)
+        else:
+            from risk_model import predict_from_dict
+
+            result = predict_from_dict(model, cat_maps, num_stats, user)
         return jsonify(result)
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
 
+@app.route("/export", methods=["GET"])
+def export():
+    """
+    Stream the source data with model predictions.
+    Query params: format=csv|parquet, gzip=1, chunk_size=<rows per scoring batch, capped at MAX_CHUNK_SIZE>.
+    """
+    try:
+        from report_export import DEFAULT_CHUNK_SIZE, MAX_CHUNK_SIZE, stream_export
+
+        fmt = request.args.get("format", "csv").lower()
+        compress = request.args.get("gzip", "0").lower() in ("1", "true", "yes")
+        chunk_size = min(MAX_CHUNK_SIZE, max(1, int(request.args.get("chunk_size", DEFAULT_CHUNK_SIZE))))
+
+        model, cat_maps, num_stats = get_model()
+        body = stream_export(model, cat_maps, num_stats, fmt=fmt, compress=compress, chunk_size=chunk_size)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+    mimetype = "text/csv" if fmt == "csv" else "application/vnd.apache.parquet"
+    headers = {"Content-Disposition": f"attachment; filename=nutriguard-report.{fmt}"}
+    if compress:
+        headers["Content-Encoding"] = "gzip"
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
+
+
+@app.route("/export/summary", methods=["GET"])
+def export_summary():
+    """Summary statistics of the scored data, computed in its own scoring pass."""
+    try:
+        from report_export import export_summary as summarize
+
+        model, cat_maps, num_stats = get_model()
+        return jsonify(summarize(model, cat_maps, num_stats))
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+
+# Warm up when the app is created, so it also happens under `flask run` or a
+# WSGI server importing api.app:app, not only with `python api/app.py`.
+if os.environ.get("WARMUP", "1") != "0":
+    warmup()
+
+
 if __name__ == "__main__":
     print("Starting Risk Prediction API...")
-    print("Train model on first request if not already saved.")
-    app.run(host="0.0.0.0", port=5000, debug=False)
+    app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), debug=False)
@@ -0,0 +1,536 @@
+"""
+Reproducible benchmark suite for the Risk Prediction Transformer.
+
+Measures each stage separately and writes the results as JSON so runs
+from different commits can be compared:
+
+    python benchmark_transformer.py --output bench/HEAD.json
+    python benchmark_transformer.py --compare bench/base.json bench/HEAD.json
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+
+from risk_prediction_transformer import (
+    CachedContextTabTransformer,
+    TabTransformer,
+    TabularConfig,
+    build_encoders,
+    encode_dataframe,
+    load_data,
+    predict_from_dict,
+    train_transformer,
+)
+
+ROOT_DIR = os.path.dirname(os.path.abspath(__file__))
+SEED = 42
+BENCHMARKS = ["startup", "encode", "predict", "forward", "cat_cache", "train", "api"]
+
+SAMPLE_USER: Dict[str, Any] = {
+    "Age": 34,
+    "Gender": "Female",
+    "BMI": 22.5,
+    "HemoglobinLevel": 13.2,
+    "IncomeLevel": 55000.0,
+    "Region": "Urban",
+    "HealthHistory": "No",
+}
+
+# =================
+# Timing utilities
+# =================
+
+def time_call(fn: Callable[[], Any], repeats: int, warmup: int = 2) -> Dict[str, float]:
+    """
+    Run fn warmup + repeats times and summarise wall-clock timings in milliseconds.
+    """
+    for _ in range(warmup):
+        fn()
+    samples: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000.0)
+    samples.sort()
+    return {
+        "repeats": repeats,
+        "mean_ms": statistics.fmean(samples),
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(0.95 * len(samples)))],
+        "min_ms": samples[0],
+    }
+
+
+def seed_everything(seed: int = SEED) -> None:
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def default_model(cat_maps: Dict[str, Dict[str, int]]) -> TabTransformer:
+    """Build a freshly initialised model with the production configuration."""
+    cat_cols = ["Gender", "Region", "HealthHistory"]
+    config = TabularConfig(
+        num_features=["Age", "BMI", "HemoglobinLevel", "IncomeLevel"],
+        cat_features=cat_cols,
+        cat_cardinalities=[len(cat_maps[col]) for col in cat_cols],
+    )
+    model = TabTransformer(config)
+    model.eval()
+    return model
+
+
+def resample(df: pd.DataFrame, n_rows: int) -> pd.DataFrame:
+    """Draw n_rows rows (with replacement) from df, deterministically."""
+    return df.sample(n=n_rows, replace=True, random_state=SEED).reset_index(drop=True)
+
+# ===========
+# Benchmarks
+# ===========
+
+def bench_encode(df: pd.DataFrame, row_counts: Sequence[int], repeats: int) -> Dict[str, Any]:
+    """encode_dataframe latency at several input sizes."""
+    cat_maps, num_stats = build_encoders(df)
+    results: Dict[str, Any] = {}
+    for n_rows in row_counts:
+        sample = resample(df, n_rows)
+        reps = max(3, repeats // max(1, n_rows // 1000))
+        stats = time_call(lambda: encode_dataframe(sample, cat_maps, num_stats), reps)
+        stats["rows_per_s"] = n_rows / (stats["median_ms"] / 1000.0)
+        results[str(n_rows)] = stats
+    return results
+
+
+def bench_predict_single(df: pd.DataFrame, repeats: int) -> Dict[str, Any]:
+    """predict_from_dict single-call latency."""
+    cat_maps, num_stats = build_encoders(df)
+    model = default_model(cat_maps)
+    return time_call(lambda: predict_from_dict(model, cat_maps, num_stats, SAMPLE_USER), repeats)
+
+
+def bench_forward(
+    df: pd.DataFrame,
+    batch_sizes: Sequence[int],
+    thread_counts: Sequence[int],
+    repeats: int,
+) -> Dict[str, Any]:
+    """Batched TabTransformer.forward throughput across batch sizes and torch thread counts."""
+    cat_maps, num_stats = build_encoders(df)
+    model = default_model(cat_maps)
+    x_num_all, x_cat_all, _ = encode_dataframe(resample(df, max(batch_sizes)), cat_maps, num_stats)
+
+    original_threads = torch.get_num_threads()
+    results: Dict[str, Any] = {}
+    try:
+        for n_threads in thread_counts:
+            torch.set_num_threads(n_threads)
+            per_batch: Dict[str, Any] = {}
+            for batch_size in batch_sizes:
+                x_num = x_num_all[:batch_size]
+                x_cat = x_cat_all[:batch_size]
+
+                def run() -> None:
+                    with torch.no_grad():
+                        model(x_num, x_cat)
+
+                stats = time_call(run, repeats)
+                stats["rows_per_s"] = batch_size / (stats["median_ms"] / 1000.0)
+                per_batch[str(batch_size)] = stats
+            results[str(n_threads)] = per_batch
+    finally:
+        torch.set_num_threads(original_threads)
+    return results
+
+
+def bench_cat_context_cache(df: pd.DataFrame, batch_sizes: Sequence[int], repeats: int) -> Dict[str, Any]:
+    """Per-call latency of the full forward vs CachedContextTabTransformer."""
+    cat_maps, num_stats = build_encoders(df)
+    model = default_model(cat_maps)
+    cached = CachedContextTabTransformer(model).eval()
+    x_num_all, x_cat_all, _ = encode_dataframe(resample(df, max(batch_sizes)), cat_maps, num_stats)
+
+    results: Dict[str, Any] = {
+        "predict_from_dict": {
+            "full": time_call(lambda: predict_from_dict(model, cat_maps, num_stats, SAMPLE_USER), repeats),
+            "cached": time_call(lambda: predict_from_dict(cached, cat_maps, num_stats, SAMPLE_USER), repeats),
+        }
+    }
+    for batch_size in batch_sizes:
+        x_num = x_num_all[:batch_size]
+        x_cat = x_cat_all[:batch_size]
+        per_mode: Dict[str, Any] = {}
+        for name, m in (("full", model), ("cached", cached)):
+
+            def run(m=m) -> None:
+                with torch.no_grad():
+                    m(x_num, x_cat)
+
+            per_mode[name] = time_call(run, repeats)
+        per_mode["speedup"] = per_mode["full"]["median_ms"] / per_mode["cached"]["median_ms"]
+        results[f"forward_{batch_size}"] = per_mode
+    return results
+
+
+def bench_train_epoch(df: pd.DataFrame, epochs: int) -> Dict[str, Any]:
+    """train_transformer wall-clock time per epoch on the full dataset."""
+    cat_maps, num_stats = build_encoders(df)
+    x_num, x_cat, y = encode_dataframe(df, cat_maps, num_stats)
+    n_val = len(df) // 5
+    model = default_model(cat_maps)
+
+    start = time.perf_counter()
+    train_transformer(
+        model,
+        x_num[n_val:],
+        x_cat[n_val:],
+        y[n_val:],
+        x_num[:n_val],
+        x_cat[:n_val],
+        y[:n_val],
+        epochs=epochs,
+        batch_size=64,
+        lr=1e-3,
+    )
+    elapsed = time.perf_counter() - start
+    return {
+        "epochs": epochs,
+        "train_rows": len(df) - n_val,
+        "total_s": elapsed,
+        "s_per_epoch": elapsed / epochs,
+    }
+
+# ====================
+# Startup (cold start)
+# ====================
+
+STARTUP_SCRIPT = """
+import json, time
+t0 = time.perf_counter()
+import {module} as m
+t1 = time.perf_counter()
+model, cat_maps, num_stats = m.load_model_and_encoders(cache_cat_context={cache})
+t2 = time.perf_counter()
+if {warmup}:
+    m.warmup_model(model)
+t3 = time.perf_counter()
+m.predict_from_dict(model, cat_maps, num_stats, {user!r})
+t4 = time.perf_counter()
+print(json.dumps({{"import_s": t1 - t0, "load_s": t2 - t1, "warmup_s": t3 - t2,
+                  "first_predict_ms": (t4 - t3) * 1000.0, "time_to_first_prediction_s": t4 - t0}}))
+"""
+
+
+def _startup_run(module: str, cache: bool, warmup: bool, repeats: int, root: str = ROOT_DIR) -> Dict[str, Any]:
+    script = STARTUP_SCRIPT.format(module=module, cache=cache, warmup=warmup, user=SAMPLE_USER)
+    runs = []
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", script],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    return {key: statistics.median(r[key] for r in runs) for key in runs[0]}
+
+
+def bench_startup(repeats: int, baseline_root: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Import time and time-to-first-prediction in fresh interpreters.
+
+    serving_path is what api/app.py does on this tree (inference module,
+    categorical-context cache, warmup). training_module times the same load
+    through the training module, which pulls in sklearn. If baseline_root is a
+    checkout of an earlier tree (e.g. a git worktree), its serving path
+    (training module, cache, no warmup) is timed as baseline_serving_path.
+    """
+    results = {
+        "serving_path": _startup_run("risk_model", cache=True, warmup=True, repeats=repeats),
+        "serving_path_no_warmup": _startup_run("risk_model", cache=True, warmup=False, repeats=repeats),
+        "training_module": _startup_run("risk_prediction_transformer", cache=True, warmup=False, repeats=repeats),
+    }
+    if baseline_root is not None:
+        results["baseline_serving_path"] = _startup_run(
+            "risk_prediction_transformer", cache=True, warmup=False, repeats=repeats, root=os.path.abspath(baseline_root)
+        )
+    return results
+
+# =========================
+# End-to-end API (/predict)
+# =========================
+
+def _free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_server(host: str, port: int, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            conn = http.client.HTTPConnection(host, port, timeout=1.0)
+            conn.request("GET", "/health")
+            if conn.getresponse().status == 200:
+                conn.close()
+                return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f"API server on {host}:{port} did not become healthy within {timeout:.0f}s")
+
+
+def start_local_server() -> Tuple[subprocess.Popen, str]:
+    """Launch api/app.py on a free local port and return (process, base_url)."""
+    port = _free_port()
+    env = dict(os.environ, PORT=str(port))
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "api", "app.py")],
+        cwd=ROOT_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        _wait_for_server("127.0.0.1", port, timeout=120.0)
+    except Exception:
+        proc.terminate()
+        raise
+    return proc, f"http://127.0.0.1:{port}"
+
+
+def bench_api(base_url: str, concurrency: int, duration: float) -> Dict[str, Any]:
+    """End-to-end POST /predict requests per second against a running server."""
+    host_port = base_url.split("://", 1)[-1].rstrip("/")
+    host, _, port = host_port.partition(":")
+    body = json.dumps(
+        {
+            "age": SAMPLE_USER["Age"],
+            "gender": SAMPLE_USER["Gender"],
+            "bmi": SAMPLE_USER["BMI"],
+            "hemoglobin": SAMPLE_USER["HemoglobinLevel"],
+            "income": SAMPLE_USER["IncomeLevel"],
+            "region": SAMPLE_USER["Region"],
+            "healthHistory": SAMPLE_USER["HealthHistory"],
+        }
+    )
+    headers = {"Content-Type": "application/json"}
+
+    # First request triggers the lazy model load; keep it out of the measurement.
+    conn = http.client.HTTPConnection(host, int(port or 80), timeout=120.0)
+    conn.request("POST", "/predict", body=body, headers=headers)
+    resp = conn.getresponse()
+    payload = resp.read()
+    conn.close()
+    if resp.status != 200:
+        raise RuntimeError(f"Warm-up POST /predict returned {resp.status}: {payload[:200]!r}")
+
+    stop_at = time.monotonic() + duration
+    lock = threading.Lock()
+    latencies: List[float] = []
+    errors = [0]
+
+    def client() -> None:
+        local: List[float] = []
+        local_errors = 0
+        c = http.client.HTTPConnection(host, int(port or 80), timeout=30.0)
+        while time.monotonic() < stop_at:
+            start = time.perf_counter()
+            try:
+                c.request("POST", "/predict", body=body, headers=headers)
+                resp = c.getresponse()
+                resp.read()
+                if resp.status != 200:
+                    # Failed requests count as errors, not as served throughput.
+                    local_errors += 1
+                    continue
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                c.close()
+                c = http.client.HTTPConnection(host, int(port or 80), timeout=30.0)
+                continue
+            local.append((time.perf_counter() - start) * 1000.0)
+        c.close()
+        with lock:
+            latencies.extend(local)
+            errors[0] += local_errors
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(client) for _ in range(concurrency)]
+    # Surface any client thread that died instead of silently dropping its samples.
+    for future in futures:
+        future.result()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": len(latencies),
+        "errors": errors[0],
+        "rps": len(latencies) / elapsed if elapsed else 0.0,
+        "median_ms": statistics.median(latencies) if latencies else None,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+    }
+
+# =========
+# Reporting
+# =========
+
+def git_revision() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=ROOT_DIR,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment_info() -> Dict[str, Any]:
+    return {
+        "git_revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch": torch.__version__,
+        "torch_threads": torch.get_num_threads(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def _flatten(prefix: str, value: Any, out: Dict[str, float]) -> None:
+    if isinstance(value, dict):
+        for k, v in value.items():
+            _flatten(f"{prefix}.{k}" if prefix else k, v, out)
+    elif isinstance(value, (int, float)) and not isinstance(value, bool):
+        out[prefix] = float(value)
+
+
+def compare_results(base_path: str, head_path: str) -> None:
+    """
+    Print timing metrics of two result files side by side.
+    Only latency (*_ms, *_s) and throughput (*_per_s, rps) metrics are compared.
+    """
+    with open(base_path) as f:
+        base: Dict[str, float] = {}
+        _flatten("", json.load(f)["results"], base)
+    with open(head_path) as f:
+        head: Dict[str, float] = {}
+        _flatten("", json.load(f)["results"], head)
+
+    print(f"{'metric':<60} {'base':>12} {'head':>12} {'change':>9}")
+    for key in sorted(base.keys() & head.keys()):
+        if not key.endswith(("_ms", "_s", "_per_s", "rps")):
+            continue
+        b, h = base[key], head[key]
+        change = (h - b) / b * 100.0 if b else 0.0
+        print(f"{key:<60} {b:>12.3f} {h:>12.3f} {change:>+8.1f}%")
+
+
+def run_suite(args: argparse.Namespace) -> Dict[str, Any]:
+    seed_everything()
+    df = load_data()
+    selected = set(args.only or BENCHMARKS)
+    results: Dict[str, Any] = {}
+
+    if "startup" in selected:
+        print("Benchmarking import time and time-to-first-prediction...")
+        results["startup"] = bench_startup(args.startup_repeats, args.startup_baseline)
+    if "encode" in selected:
+        print("Benchmarking encode_dataframe...")
+        results["encode_dataframe"] = bench_encode(df, args.encode_rows, args.repeats)
+    if "predict" in selected:
+        print("Benchmarking predict_from_dict...")
+        results["predict_from_dict"] = bench_predict_single(df, args.repeats)
+    if "forward" in selected:
+        print("Benchmarking TabTransformer.forward...")
+        results["forward"] = bench_forward(df, args.batch_sizes, args.threads, args.repeats)
+    if "cat_cache" in selected:
+        print("Benchmarking categorical-context cache...")
+        results["cat_context_cache"] = bench_cat_context_cache(df, args.batch_sizes, args.repeats)
+    if "train" in selected:
+        print("Benchmarking train_transformer...")
+        seed_everything()
+        results["train_transformer"] = bench_train_epoch(df, args.train_epochs)
+    if "api" in selected:
+        print("Benchmarking POST /predict...")
+        proc = None
+        base_url = args.url
+        if base_url is None:
+            proc, base_url = start_local_server()
+        try:
+            results["api_predict"] = bench_api(base_url, args.concurrency, args.duration)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait(timeout=10)
+
+    return {"environment": environment_info(), "config": vars(args), "results": results}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Risk Prediction Transformer.")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the JSON results.")
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=BENCHMARKS,
+        help="Run only the selected benchmarks.",
+    )
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--encode-rows", type=int, nargs="+", default=[1, 1_000, 100_000])
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 8, 64, 256, 1024])
+    parser.add_argument("--threads", type=int, nargs="+", default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument("--startup-repeats", type=int, default=5, help="Fresh interpreters per startup variant.")
+    parser.add_argument(
+        "--startup-baseline",
+        metavar="DIR",
+        help="Checkout of an earlier tree whose serving path is timed for comparison (e.g. a git worktree).",
+    )
+    parser.add_argument("--train-epochs", type=int, default=3)
+    parser.add_argument("--url", help="Benchmark an already running API instead of starting api/app.py.")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to load the API for.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        metavar=("BASE", "HEAD"),
+        help="Compare two result files instead of running benchmarks.",
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare_results(*args.compare)
+        return
+
+    report = run_suite(args)
+    out_dir = os.path.dirname(os.path.abspath(args.output))
+    os.makedirs(out_dir, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print("Saved benchmark results to", args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+Parallel stratified k-fold cross-validation for the Risk Prediction Transformer.
+
+Each fold is trained in its own process with its own torch thread budget and
+evaluated on its held-out rows in fixed-size chunks (only a running confusion
+matrix is kept). Fold results are aggregated into a JSON report:
+
+    python cross_validation.py --folds 5 --workers 5
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import torch
+from sklearn.model_selection import StratifiedKFold
+
+from risk_prediction_transformer import (
+    MODEL_DIR,
+    TabTransformer,
+    TabularConfig,
+    build_encoders,
+    encode_dataframe,
+    load_data,
+    predict_proba_batched,
+    train_transformer,
+)
+
+CV_REPORT_PATH = os.path.join(MODEL_DIR, "cv_report.json")
+CLASSES = ["Low", "Medium", "High"]
+
+# =====================
+# Metrics
+# =====================
+
+def metrics_from_confusion(cm: np.ndarray) -> Dict[str, Any]:
+    """
+    Accuracy and per-class precision / recall / F1 / support from a confusion
+    matrix (rows: true, cols: pred).
+    """
+    cm = np.asarray(cm, dtype=np.int64)
+    tp = np.diag(cm).astype(float)
+    support = cm.sum(axis=1)
+    predicted = cm.sum(axis=0)
+    precision = np.divide(tp, predicted, out=np.zeros_like(tp), where=predicted > 0)
+    recall = np.divide(tp, support, out=np.zeros_like(tp), where=support > 0)
+    denom = precision + recall
+    f1 = np.divide(2 * precision * recall, denom, out=np.zeros_like(tp), where=denom > 0)
+
+    per_class = {
+        cls: {
+            "precision": float(precision[i]),
+            "recall": float(recall[i]),
+            "f1": float(f1[i]),
+            "support": int(support[i]),
+        }
+        for i, cls in enumerate(CLASSES)
+    }
+    return {
+        "accuracy": float(tp.sum() / cm.sum()) if cm.sum() else 0.0,
+        "macro_f1": float(f1.mean()),
+        "per_class": per_class,
+        "confusion_matrix": cm.tolist(),
+    }
+
+# =====================
+# Fold worker
+# =====================
+
+def _init_worker(torch_threads: int) -> None:
+    """Give every worker process its own, non-overlapping torch thread budget."""
+    torch.set_num_threads(torch_threads)
+    torch.set_num_interop_threads(1)
+
+
+def _run_fold(
+    fold: int,
+    df: pd.DataFrame,
+    train_idx: np.ndarray,
+    test_idx: np.ndarray,
+    epochs: int,
+    batch_size: int,
+    lr: float,
+    eval_chunk_size: int,
+    seed: int,
+) -> Dict[str, Any]:
+    """Train on one fold's training rows and evaluate on its held-out rows."""
+    start = time.perf_counter()
+    torch.manual_seed(seed + fold)
+
+    train_df = df.iloc[train_idx]
+    test_df = df.iloc[test_idx]
+
+    # Encoders are fitted on the training rows only, so held-out stats do not leak.
+    cat_maps, num_stats = build_encoders(train_df)
+    x_num_train, x_cat_train, y_train = encode_dataframe(train_df, cat_maps, num_stats)
+    x_num_test, x_cat_test, y_test = encode_dataframe(test_df, cat_maps, num_stats)
+
+    cat_cols = ["Gender", "Region", "HealthHistory"]
+    config = TabularConfig(
+        num_features=["Age", "BMI", "HemoglobinLevel", "IncomeLevel"],
+        cat_features=cat_cols,
+        cat_cardinalities=[len(cat_maps[col]) for col in cat_cols],
+        d_model=32,
+        n_heads=4,
+        n_layers=2,
+        dim_feedforward=64,
+        dropout=0.1,
+        num_classes=3,
+    )
+    model = TabTransformer(config)
+    # No per-epoch validation: the fold is scored once on its test split below.
+    train_transformer(
+        model,
+        x_num_train,
+        x_cat_train,
+        y_train,
+        None,
+        None,
+        None,
+        epochs=epochs,
+        batch_size=batch_size,
+        lr=lr,
+        verbose=False,
+    )
+    train_s = time.perf_counter() - start
+
+    n_classes = len(CLASSES)
+    cm = np.zeros((n_classes, n_classes), dtype=np.int64)
+    for chunk_start, probs in predict_proba_batched(model, x_num_test, x_cat_test, chunk_size=eval_chunk_size):
+        preds = probs.argmax(dim=1).numpy()
+        y_true = y_test[chunk_start : chunk_start + len(preds)].numpy()
+        cm += np.bincount(y_true * n_classes + preds, minlength=n_classes * n_classes).reshape(n_classes, n_classes)
+
+    result = metrics_from_confusion(cm)
+    result.update(
+        {
+            "fold": fold,
+            "n_train": int(len(train_idx)),
+            "n_test": int(len(test_idx)),
+            "train_s": train_s,
+            "total_s": time.perf_counter() - start,
+            "pid": os.getpid(),
+        }
+    )
+    return result
+
+# =====================
+# Runner
+# =====================
+
+def run_cross_validation(
+    df: Optional[pd.DataFrame] = None,
+    n_folds: int = 5,
+    n_workers: Optional[int] = None,
+    threads_per_worker: Optional[int] = None,
+    epochs: int = 20,
+    batch_size: int = 64,
+    lr: float = 1e-3,
+    eval_chunk_size: int = 1024,
+    seed: int = 42,
+    report_path: Optional[str] = CV_REPORT_PATH,
+) -> Dict[str, Any]:
+    """
+    Train and evaluate n_folds stratified folds concurrently and aggregate the results.
+    """
+    if df is None:
+        df = load_data()
+    cpu_count = os.cpu_count() or 1
+    n_workers = n_workers or min(n_folds, cpu_count)
+    threads_per_worker = threads_per_worker or max(1, cpu_count // n_workers)
+
+    label_map = {"Low": 0, "Medium": 1, "High": 2}
+    y = df["RiskLevel"].map(label_map).to_numpy()
+    splitter = StratifiedKFold(n_splits=n_folds, shuffle=True, random_state=seed)
+
+    print(f"Running {n_folds}-fold CV on {n_workers} processes x {threads_per_worker} torch threads...")
+    start = time.perf_counter()
+    folds: List[Dict[str, Any]] = []
+    # "spawn" avoids forking a parent that may already hold torch's thread pools.
+    with ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=mp.get_context("spawn"),
+        initializer=_init_worker,
+        initargs=(threads_per_worker,),
+    ) as pool:
+        futures = [
+            pool.submit(_run_fold, fold, df, train_idx, test_idx, epochs, batch_size, lr, eval_chunk_size, seed)
+            for fold, (train_idx, test_idx) in enumerate(splitter.split(np.zeros(len(y)), y))
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            folds.append(result)
+            print(f"Fold {result['fold']}: accuracy {result['accuracy']:.3f} ({result['total_s']:.1f}s)")
+    wall_s = time.perf_counter() - start
+    folds.sort(key=lambda r: r["fold"])
+
+    accuracies = np.array([r["accuracy"] for r in folds])
+    per_class_summary = {
+        cls: {
+            metric: {
+                "mean": float(np.mean([r["per_class"][cls][metric] for r in folds])),
+                "std": float(np.std([r["per_class"][cls][metric] for r in folds])),
+            }
+            for metric in ("precision", "recall", "f1")
+        }
+        for cls in CLASSES
+    }
+    pooled = metrics_from_confusion(np.sum([r["confusion_matrix"] for r in folds], axis=0))
+
+    report = {
+        "n_folds": n_folds,
+        "n_workers": n_workers,
+        "threads_per_worker": threads_per_worker,
+        "epochs": epochs,
+        "seed": seed,
+        "wall_clock_s": wall_s,
+        "sum_fold_s": float(sum(r["total_s"] for r in folds)),
+        "accuracy": {"mean": float(accuracies.mean()), "std": float(accuracies.std())},
+        "per_class": per_class_summary,
+        "pooled": pooled,
+        "folds": folds,
+    }
+
+    print("\n=== Cross-Validation Summary ===")
+    print(f"Accuracy: {accuracies.mean():.3f} ± {accuracies.std():.3f}")
+    print("Pooled confusion matrix (rows: true, cols: pred; 0=Low,1=Med,2=High):")
+    print(np.array(pooled["confusion_matrix"]))
+    print(f"Wall clock: {wall_s:.1f}s (sum of fold times {report['sum_fold_s']:.1f}s)")
+
+    if report_path:
+        with open(report_path, "w") as f:
+            json.dump(report, f, indent=2)
+        print("Saved report to", report_path)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Parallel k-fold cross-validation of the Transformer.")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: min(folds, CPUs)).")
+    parser.add_argument("--threads-per-worker", type=int, help="Torch threads per worker (default: CPUs / workers).")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--eval-chunk-size", type=int, default=1024)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=CV_REPORT_PATH)
+    args = parser.parse_args()
+
+    run_cross_validation(
+        n_folds=args.folds,
+        n_workers=args.workers,
+        threads_per_worker=args.threads_per_worker,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        eval_chunk_size=args.eval_chunk_size,
+        seed=args.seed,
+        report_path=args.output,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,390 @@
+"""
+Knowledge distillation of the TabTransformer into a tiny fast-path student.
+
+The student is a one-hidden-layer MLP trained on the transformer's soft
+probabilities (training CSV plus freshly generated samples). At serving time
+it answers first and defers to the transformer only when its own confidence
+is below a threshold:
+
+    python distill_student.py            # distill, report, save student_state.pt
+"""
+import hashlib
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+
+from risk_model import (
+    DEVICE,
+    ENCODERS_PATH,
+    MODEL_DIR,
+    MODEL_PATH,
+    TabTransformer,
+    build_prediction_response,
+    encode_dataframe,
+    encode_records,
+    load_model_and_encoders,
+)
+
+STUDENT_PATH = os.path.join(MODEL_DIR, "student_state.pt")
+STUDENT_REPORT_PATH = os.path.join(MODEL_DIR, "student_report.json")
+DEFAULT_THRESHOLD = 0.9
+
+# ===================
+# Student model
+# ===================
+
+class StudentMLP(nn.Module):
+    """
+    One-hidden-layer MLP over standardized numerics and one-hot categoricals.
+
+    The one-hot part of the first layer is stored as per-feature embeddings
+    (mathematically the same as a Linear over one-hot columns, without
+    materializing them).
+    """
+
+    def __init__(self, n_num: int, cat_cardinalities: List[int], hidden_dim: int = 16, num_classes: int = 3):
+        super().__init__()
+        self.n_num = n_num
+        self.cat_cardinalities = list(cat_cardinalities)
+        self.hidden_dim = hidden_dim
+        self.num_classes = num_classes
+
+        self.num_linear = nn.Linear(n_num, hidden_dim)
+        self.cat_embeddings = nn.ModuleList(
+            [nn.Embedding(cardinality, hidden_dim) for cardinality in cat_cardinalities]
+        )
+        self.out = nn.Linear(hidden_dim, num_classes)
+
+    def forward(self, x_num: torch.Tensor, x_cat: torch.Tensor) -> torch.Tensor:
+        h = self.num_linear(x_num)
+        for i, emb in enumerate(self.cat_embeddings):
+            h = h + emb(x_cat[:, i])
+        return self.out(F.relu(h))
+
+
+class TieredPredictor:
+    """
+    Student first, transformer fallback for rows where the student's top-class
+    probability is below `threshold`.
+    """
+
+    def __init__(self, student: StudentMLP, teacher: TabTransformer, threshold: float = DEFAULT_THRESHOLD):
+        self.student = student.eval()
+        self.teacher = teacher.eval()
+        self.threshold = threshold
+
+    def predict_proba(self, x_num: torch.Tensor, x_cat: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Returns (probs, from_student) where from_student marks rows answered by the student.
+        """
+        x_num = x_num.to(DEVICE)
+        x_cat = x_cat.to(DEVICE)
+        with torch.no_grad():
+            probs = torch.softmax(self.student(x_num, x_cat), dim=1)
+            from_student = probs.max(dim=1).values >= self.threshold
+            if not bool(from_student.all()):
+                defer = ~from_student
+                probs[defer] = torch.softmax(self.teacher(x_num[defer], x_cat[defer]), dim=1)
+        return probs, from_student
+
+
+def predict_tiered_from_dict(
+    predictor: TieredPredictor,
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+    user: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Same contract as predict_from_dict, served through the tiered predictor.
+    """
+    x_num, x_cat = encode_records([user], cat_maps, num_stats)
+    probs, from_student = predictor.predict_proba(x_num, x_cat)
+    model_name = "Fast-path model" if bool(from_student[0]) else "Transformer model"
+    return build_prediction_response(probs[0].cpu().numpy(), user, num_stats, model_name=model_name)
+
+# ===================
+# Distillation
+# ===================
+
+def teacher_probabilities(
+    teacher: TabTransformer,
+    x_num: torch.Tensor,
+    x_cat: torch.Tensor,
+    temperature: float = 1.0,
+    batch_size: int = 4096,
+) -> torch.Tensor:
+    """Softened teacher probabilities, computed in batches."""
+    teacher.eval()
+    out = []
+    with torch.no_grad():
+        for i in range(0, x_num.size(0), batch_size):
+            logits = teacher(x_num[i : i + batch_size].to(DEVICE), x_cat[i : i + batch_size].to(DEVICE))
+            out.append(torch.softmax(logits / temperature, dim=1).cpu())
+    return torch.cat(out)
+
+
+def distill_student(
+    teacher: TabTransformer,
+    x_num: torch.Tensor,
+    x_cat: torch.Tensor,
+    hidden_dim: int = 16,
+    epochs: int = 30,
+    batch_size: int = 256,
+    lr: float = 3e-3,
+    temperature: float = 2.0,
+) -> StudentMLP:
+    """
+    Train a StudentMLP to match the teacher's temperature-softened probabilities (KL loss).
+    """
+    config = teacher.config
+    student = StudentMLP(len(config.num_features), config.cat_cardinalities, hidden_dim, config.num_classes)
+    student.to(DEVICE)
+    soft_targets = teacher_probabilities(teacher, x_num, x_cat, temperature=temperature)
+    optimizer = torch.optim.Adam(student.parameters(), lr=lr)
+
+    n_train = x_num.size(0)
+    for epoch in range(1, epochs + 1):
+        student.train()
+        perm = torch.randperm(n_train)
+        total_loss = 0.0
+        n_batches = 0
+        for i in range(0, n_train, batch_size):
+            idx = perm[i : i + batch_size]
+            logits = student(x_num[idx].to(DEVICE), x_cat[idx].to(DEVICE))
+            log_probs = F.log_softmax(logits / temperature, dim=1)
+            loss = F.kl_div(log_probs, soft_targets[idx].to(DEVICE), reduction="batchmean") * temperature**2
+
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+            total_loss += float(loss.item())
+            n_batches += 1
+
+        if epoch == 1 or epoch % 10 == 0 or epoch == epochs:
+            print(f"Epoch {epoch:02d}/{epochs} - distill_loss: {total_loss / n_batches:.4f}")
+
+    student.eval()
+    return student
+
+
+def _per_call_ms(fn, repeats: int = 200, warmup: int = 5) -> float:
+    for _ in range(warmup):
+        fn()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        fn()
+    return (time.perf_counter() - start) / repeats * 1000.0
+
+
+def evaluate_student(
+    teacher: TabTransformer,
+    student: StudentMLP,
+    x_num: torch.Tensor,
+    x_cat: torch.Tensor,
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+    records: List[Dict[str, Any]],
+    threshold: float = DEFAULT_THRESHOLD,
+) -> Dict[str, Any]:
+    """
+    Agreement with the teacher (student alone and tiered) on held-out rows, the
+    share of traffic the student serves, and single-call / batch latency.
+    records are raw held-out rows used for the single-call latency sample.
+    """
+    predictor = TieredPredictor(student, teacher, threshold)
+    teacher_pred = teacher_probabilities(teacher, x_num, x_cat).argmax(dim=1)
+    with torch.no_grad():
+        student_pred = student(x_num.to(DEVICE), x_cat.to(DEVICE)).argmax(dim=1).cpu()
+    tiered_probs, from_student = predictor.predict_proba(x_num, x_cat)
+    tiered_pred = tiered_probs.argmax(dim=1).cpu()
+    from_student = from_student.cpu()
+
+    served = int(from_student.sum())
+    confident_agreement = (
+        float((student_pred[from_student] == teacher_pred[from_student]).float().mean()) if served else None
+    )
+
+    # Single-request latency over many held-out rows, including encoding as on the
+    # API path. Whether a row is served by the student or deferred decides its
+    # cost, so the two groups are reported separately.
+    teacher_times: List[float] = []
+    tiered_times: List[float] = []
+    served_flags: List[bool] = []
+    for user in records:
+
+        def teacher_call(user=user) -> None:
+            xn, xc = encode_records([user], cat_maps, num_stats)
+            with torch.no_grad():
+                torch.softmax(teacher(xn.to(DEVICE), xc.to(DEVICE)), dim=1)
+
+        def tiered_call(user=user) -> torch.Tensor:
+            xn, xc = encode_records([user], cat_maps, num_stats)
+            return predictor.predict_proba(xn, xc)[1]
+
+        teacher_times.append(_per_call_ms(teacher_call, repeats=5, warmup=1))
+        tiered_times.append(_per_call_ms(tiered_call, repeats=5, warmup=1))
+        served_flags.append(bool(tiered_call()[0]))
+
+    def _mean(values: List[float]) -> Optional[float]:
+        return statistics.fmean(values) if values else None
+
+    teacher_ms = statistics.fmean(teacher_times)
+    tiered_ms = statistics.fmean(tiered_times)
+    served_ms = _mean([t for t, f in zip(tiered_times, served_flags) if f])
+    deferred_ms = _mean([t for t, f in zip(tiered_times, served_flags) if not f])
+
+    batch = min(1024, x_num.size(0))
+    xb_num, xb_cat = x_num[:batch], x_cat[:batch]
+
+    def teacher_batch() -> None:
+        with torch.no_grad():
+            teacher(xb_num.to(DEVICE), xb_cat.to(DEVICE))
+
+    def tiered_batch() -> None:
+        predictor.predict_proba(xb_num, xb_cat)
+
+    teacher_batch_ms = _per_call_ms(teacher_batch, repeats=20)
+    tiered_batch_ms = _per_call_ms(tiered_batch, repeats=20)
+
+    return {
+        "threshold": threshold,
+        "n_eval": int(x_num.size(0)),
+        "student_agreement": float((student_pred == teacher_pred).float().mean()),
+        "tiered_agreement": float((tiered_pred == teacher_pred).float().mean()),
+        "student_coverage": served / max(1, int(x_num.size(0))),
+        "student_agreement_when_confident": confident_agreement,
+        "latency_single_ms": {
+            "n_rows": len(records),
+            "transformer": teacher_ms,
+            "tiered": tiered_ms,
+            "tiered_student_served": served_ms,
+            "tiered_deferred": deferred_ms,
+            "student_served_share": sum(served_flags) / max(1, len(served_flags)),
+            "speedup": teacher_ms / tiered_ms,
+        },
+        "latency_batch_ms": {
+            "batch_size": batch,
+            "transformer": teacher_batch_ms,
+            "tiered": tiered_batch_ms,
+            "speedup": teacher_batch_ms / tiered_batch_ms,
+        },
+    }
+
+# ===================
+# Save / Load
+# ===================
+
+def teacher_fingerprint() -> str:
+    """Hash of the saved transformer weights and encoders the student was distilled from."""
+    digest = hashlib.sha256()
+    for path in (MODEL_PATH, ENCODERS_PATH):
+        with open(path, "rb") as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def save_student(student: StudentMLP, threshold: float = DEFAULT_THRESHOLD) -> None:
+    """Save student weights together with the shape, serving threshold and teacher fingerprint."""
+    torch.save(
+        {
+            "state_dict": student.state_dict(),
+            "n_num": student.n_num,
+            "cat_cardinalities": student.cat_cardinalities,
+            "hidden_dim": student.hidden_dim,
+            "num_classes": student.num_classes,
+            "threshold": threshold,
+            "teacher_fingerprint": teacher_fingerprint(),
+        },
+        STUDENT_PATH,
+    )
+
+
+def load_student() -> Tuple[StudentMLP, float]:
+    """
+    Load the student and its serving threshold from disk.
+
+    Raises ValueError if the saved transformer or encoders changed since the
+    student was distilled (e.g. after a retrain or incremental update).
+    """
+    payload = torch.load(STUDENT_PATH, map_location=DEVICE)
+    if payload.get("teacher_fingerprint") != teacher_fingerprint():
+        raise ValueError(f"{STUDENT_PATH} was distilled from a different model; re-run distill_student.py")
+    student = StudentMLP(
+        payload["n_num"],
+        payload["cat_cardinalities"],
+        payload["hidden_dim"],
+        payload["num_classes"],
+    )
+    student.load_state_dict(payload["state_dict"])
+    student.to(DEVICE)
+    student.eval()
+    return student, float(payload["threshold"])
+
+
+def main(n_generated: int = 20000, threshold: float = DEFAULT_THRESHOLD, n_latency_rows: int = 300) -> None:
+    """
+    Distill the saved transformer into a student, report agreement and latency, save both.
+    """
+    import pandas as pd
+
+    from risk_prediction_transformer import generate_synthetic_data, load_data
+
+    torch.manual_seed(0)
+    print("Loading transformer and encoders...")
+    teacher, cat_maps, num_stats = load_model_and_encoders()
+    teacher.to(DEVICE)
+
+    print(f"Building distillation set (CSV + {n_generated} generated samples)...")
+    df = load_data()
+    generated = generate_synthetic_data(n_samples=n_generated, seed=7)
+    pool = pd.concat([df, generated], ignore_index=True).sample(frac=1.0, random_state=42).reset_index(drop=True)
+    x_num, x_cat, _ = encode_dataframe(pool, cat_maps, num_stats)
+
+    n_eval = max(1, len(pool) // 10)
+    print("Distilling student...")
+    student = distill_student(teacher, x_num[n_eval:], x_cat[n_eval:])
+
+    report = evaluate_student(
+        teacher,
+        student,
+        x_num[:n_eval],
+        x_cat[:n_eval],
+        cat_maps,
+        num_stats,
+        pool.iloc[: min(n_eval, n_latency_rows)].to_dict(orient="records"),
+        threshold=threshold,
+    )
+
+    print("\n=== Student vs Transformer ===")
+    print(f"Agreement (student alone): {report['student_agreement']:.3f}")
+    print(f"Agreement (tiered @ {threshold:.2f}): {report['tiered_agreement']:.3f}")
+    print(f"Served by student: {report['student_coverage'] * 100:.1f}%")
+    single = report["latency_single_ms"]
+    print(
+        f"Single call over {single['n_rows']} rows: transformer {single['transformer']:.3f} ms, "
+        f"tiered {single['tiered']:.3f} ms ({single['speedup']:.1f}x)"
+    )
+    if single["tiered_student_served"] is not None:
+        print(f"  student-served calls: {single['tiered_student_served']:.3f} ms")
+    if single["tiered_deferred"] is not None:
+        print(f"  deferred calls: {single['tiered_deferred']:.3f} ms")
+    batch = report["latency_batch_ms"]
+    print(
+        f"Batch of {batch['batch_size']}: transformer {batch['transformer']:.3f} ms, "
+        f"tiered {batch['tiered']:.3f} ms ({batch['speedup']:.1f}x)"
+    )
+
+    save_student(student, threshold)
+    with open(STUDENT_REPORT_PATH, "w") as f:
+        json.dump(report, f, indent=2)
+    print("\nSaved to", STUDENT_PATH, "and", STUDENT_REPORT_PATH)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,21 @@
-import { FileDown, FileText } from "lucide-react";
+import axios from "axios";
+import { BrainCircuit, FileDown, FileText } from "lucide-react";
 import { dataset } from "@/data/dataset";
 
+// Model-backed Flask API (api/app.py, port 5000) that serves the scored export and its summary.
+// It runs alongside the FastAPI backend on port 8000; see the README.
+const EXPORT_API_URL = "http://127.0.0.1:5000";
+
+const RISK_LEVELS = ["Low", "Medium", "High"] as const;
+
+interface ExportSummary {
+  total: number;
+  labelled: Record<string, number>;
+  predicted: Record<string, number>;
+  mean_probability: Record<string, number>;
+  agreement_rate: number;
+}
+
 const Reports = () => {
   const downloadCSV = () => {
     const headers = ["age", "gender", "bmi", "hemoglobin", "incomeLevel", "region", "healthHistory", "riskLevel"];
@@ -17,8 +32,42 @@ const Reports = () => {
     URL.revokeObjectURL(url);
   };
 
-  const downloadPDF = () => {
-    const summary = `NutriGuard AI Report\nGenerated: ${new Date().toLocaleString()}\n\nTotal Records: ${dataset.length}\nLow Risk: ${dataset.filter((r) => r.riskLevel === "Low").length}\nMedium Risk: ${dataset.filter((r) => r.riskLevel === "Medium").length}\nHigh Risk: ${dataset.filter((r) => r.riskLevel === "High").length}`;
+  const downloadScoredCSV = () => {
+    const a = document.createElement("a");
+    a.href = `${EXPORT_API_URL}/export?format=csv&gzip=1`;
+    a.download = "nutriguard-report-scored.csv";
+    a.click();
+  };
+
+  const downloadPDF = async () => {
+    let lines: string[];
+    try {
+      const { data } = await axios.get<ExportSummary>(`${EXPORT_API_URL}/export/summary`);
+      lines = [
+        `Total Records: ${data.total}`,
+        "",
+        "Labelled risk:",
+        ...RISK_LEVELS.map((level) => `  ${level} Risk: ${data.labelled[level]}`),
+        "",
+        "Model-predicted risk:",
+        ...RISK_LEVELS.map(
+          (level) => `  ${level} Risk: ${data.predicted[level]} (mean probability ${data.mean_probability[level].toFixed(1)}%)`
+        ),
+        "",
+        `Model/label agreement: ${(data.agreement_rate * 100).toFixed(1)}%`,
+      ];
+    } catch {
+      // Model API not running: fall back to the labelled counts of the bundled dataset.
+      const counts: Record<string, number> = { Low: 0, Medium: 0, High: 0 };
+      for (const r of dataset) counts[r.riskLevel] = (counts[r.riskLevel] ?? 0) + 1;
+      lines = [
+        `Total Records: ${dataset.length}`,
+        ...RISK_LEVELS.map((level) => `${level} Risk: ${counts[level]}`),
+        "",
+        "Model predictions unavailable: start the model API (python api/app.py) on port 5000.",
+      ];
+    }
+    const summary = `NutriGuard AI Report\nGenerated: ${new Date().toLocaleString()}\n\n${lines.join("\n")}`;
     const blob = new Blob([summary], { type: "text/plain" });
     const url = URL.createObjectURL(blob);
     const a = document.createElement("a");
@@ -54,6 +103,18 @@ const Reports = () => {
               <p className="text-sm text-muted-foreground">Export dataset as CSV file</p>
             </div>
           </button>
+          <button
+            onClick={downloadScoredCSV}
+            className="flex items-center gap-4 p-6 bg-muted rounded-2xl hover:bg-muted/80 transition-colors text-left"
+          >
+            <div className="p-3 rounded-2xl bg-primary/10">
+              <BrainCircuit className="w-6 h-6 text-primary" />
+            </div>
+            <div>
+              <p className="font-semibold text-foreground">Download Scored CSV</p>
+              <p className="text-sm text-muted-foreground">Stream dataset with model risk and probabilities</p>
+            </div>
+          </button>
           <button
             onClick={downloadPDF}
             className="flex items-center gap-4 p-6 bg-muted rounded-2xl hover:bg-muted/80 transition-colors text-left"
@@ -63,7 +124,7 @@ const Reports = () => {
             </div>
             <div>
               <p className="font-semibold text-foreground">Export PDF</p>
-              <p className="text-sm text-muted-foreground">Generate summary report</p>
+              <p className="text-sm text-muted-foreground">Generate summary report with model predictions</p>
             </div>
           </button>
         </div>
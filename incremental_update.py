@@ -0,0 +1,295 @@
+"""
+Incremental fine-tuning of the saved Transformer from newly labelled records.
+
+Instead of re-running main() over the whole history, this loads
+model_state.pt / encoders.json and fine-tunes on the new batch plus a bounded
+replay sample of older rows, so the cost scales with the size of the delta:
+
+    python incremental_update.py new_records.csv --epochs 5
+
+- num_stats are merged with the new rows using streaming mean/variance
+  updates; the numeric input projections are re-based so the model's
+  function is unchanged by the new standardization before fine-tuning.
+- Unseen category values are appended to cat_maps and the embedding tables
+  grow by one row each (initialized to the mean of the existing rows).
+- replay_buffer.csv is a fixed-size uniform reservoir sample of all rows
+  seen so far; new rows are appended to the data CSV so a full retrain
+  still sees everything.
+- A distilled student (student_state.pt) no longer matches the updated
+  model and is not served until distill_student.py is re-run.
+"""
+import argparse
+import json
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import torch
+import torch.nn as nn
+
+from distill_student import STUDENT_PATH
+from risk_prediction_transformer import (
+    DATA_FILE,
+    ENCODERS_PATH,
+    MODEL_DIR,
+    TabTransformer,
+    encode_dataframe,
+    load_data,
+    load_model_and_encoders,
+    save_model_and_encoders,
+    train_transformer,
+)
+
+REPLAY_PATH = os.path.join(MODEL_DIR, "replay_buffer.csv")
+DEFAULT_REPLAY_SIZE = 2000
+
+NUM_COLS = ["Age", "BMI", "HemoglobinLevel", "IncomeLevel"]
+CAT_COLS = ["Gender", "Region", "HealthHistory"]
+REQUIRED_COLS = NUM_COLS + CAT_COLS + ["RiskLevel"]
+RISK_LEVELS = ["Low", "Medium", "High"]
+
+# ==========================
+# Encoder / model surgery
+# ==========================
+
+def merge_num_stats(
+    num_stats: Dict[str, Tuple[float, float]],
+    n_old: int,
+    new_df: pd.DataFrame,
+) -> Dict[str, Tuple[float, float]]:
+    """
+    Merge (mean, sample std) over n_old rows with the new rows using the
+    parallel mean/variance update (Chan et al.), without revisiting old data.
+    """
+    merged: Dict[str, Tuple[float, float]] = {}
+    for col in NUM_COLS:
+        mean_a, std_a = num_stats[col]
+        vals = new_df[col].astype(float).dropna().to_numpy()
+        n_b = len(vals)
+        if n_b == 0:
+            merged[col] = (mean_a, std_a)
+            continue
+
+        m2_a = std_a**2 * max(n_old - 1, 0)
+        mean_b = float(vals.mean())
+        m2_b = float(((vals - mean_b) ** 2).sum())
+
+        n = n_old + n_b
+        delta = mean_b - mean_a
+        mean = mean_a + delta * n_b / n
+        m2 = m2_a + m2_b + delta**2 * n_old * n_b / n
+        std = math.sqrt(m2 / (n - 1)) if n > 1 else 0.0
+        merged[col] = (float(mean), float(std or 1.0))
+    return merged
+
+
+@torch.no_grad()
+def rebase_numeric_projections(
+    model: TabTransformer,
+    old_stats: Dict[str, Tuple[float, float]],
+    new_stats: Dict[str, Tuple[float, float]],
+) -> None:
+    """
+    Adjust each numeric token's Linear so that, fed values standardized with
+    new_stats, it produces exactly the tokens it produced under old_stats.
+    """
+    for linear, col in zip(model.num_linears, NUM_COLS):
+        mean_old, std_old = old_stats[col]
+        mean_new, std_new = new_stats[col]
+        w = linear.weight[:, 0].clone()
+        linear.weight[:, 0] = w * (std_new / std_old)
+        linear.bias += w * ((mean_new - mean_old) / std_old)
+
+
+@torch.no_grad()
+def grow_categories(
+    model: TabTransformer,
+    cat_maps: Dict[str, Dict[str, int]],
+    new_df: pd.DataFrame,
+) -> List[str]:
+    """
+    Append unseen category values to cat_maps (in place) and grow the matching
+    embedding tables. Returns the added values as "Column=value".
+    """
+    added: List[str] = []
+    for i, col in enumerate(CAT_COLS):
+        mapping = cat_maps[col]
+        new_values = [v for v in pd.unique(new_df[col].dropna()) if v not in mapping]
+        if not new_values:
+            continue
+        for value in new_values:
+            mapping[value] = len(mapping)
+            added.append(f"{col}={value}")
+
+        old_emb = model.cat_embeddings[i]
+        new_emb = nn.Embedding(len(mapping), old_emb.embedding_dim).to(old_emb.weight.device)
+        new_emb.weight[: old_emb.num_embeddings] = old_emb.weight
+        new_emb.weight[old_emb.num_embeddings :] = old_emb.weight.mean(dim=0)
+        model.cat_embeddings[i] = new_emb
+        model.config.cat_cardinalities[i] = len(mapping)
+    return added
+
+# ==========================
+# Replay buffer
+# ==========================
+
+def load_replay_buffer(capacity: int, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Load the replay reservoir, bootstrapping it once from the data CSV
+    (a uniform sample of at most capacity rows) if it does not exist yet.
+    """
+    if os.path.exists(REPLAY_PATH):
+        return pd.read_csv(REPLAY_PATH)
+    df = load_data()
+    if len(df) <= capacity:
+        return df.reset_index(drop=True)
+    idx = rng.choice(len(df), size=capacity, replace=False)
+    return df.iloc[np.sort(idx)].reset_index(drop=True)
+
+
+def update_replay_buffer(
+    buffer: pd.DataFrame,
+    n_seen: int,
+    new_df: pd.DataFrame,
+    capacity: int,
+    rng: np.random.Generator,
+) -> pd.DataFrame:
+    """
+    Reservoir-sample (Algorithm R) the new rows into the buffer so it stays a
+    uniform sample of all n_seen + len(new_df) rows. O(len(new_df)).
+    """
+    buffer = buffer.reset_index(drop=True)
+    rows = buffer.to_dict(orient="records")
+    for j, rec in enumerate(new_df[buffer.columns].to_dict(orient="records")):
+        if len(rows) < capacity:
+            rows.append(rec)
+            continue
+        r = int(rng.integers(0, n_seen + j + 1))
+        if r < capacity:
+            rows[r] = rec
+    return pd.DataFrame(rows, columns=buffer.columns)
+
+def append_to_data_file(new_df: pd.DataFrame) -> None:
+    """Append rows to the data CSV in the column order of its existing header."""
+    if not os.path.exists(DATA_FILE):
+        new_df.to_csv(DATA_FILE, index=False)
+        return
+    columns = pd.read_csv(DATA_FILE, nrows=0).columns
+    new_df.reindex(columns=columns).to_csv(DATA_FILE, mode="a", header=False, index=False)
+
+# ==========================
+# Update entry point
+# ==========================
+
+def incremental_update(
+    new_df: pd.DataFrame,
+    epochs: int = 5,
+    batch_size: int = 64,
+    lr: float = 3e-4,
+    replay_size: int = DEFAULT_REPLAY_SIZE,
+    append_to_data: bool = True,
+    seed: Optional[int] = None,
+) -> TabTransformer:
+    """
+    Fine-tune the saved model on new_df plus the replay sample, update encoders,
+    and save everything back in place.
+    """
+    missing = [col for col in REQUIRED_COLS if col not in new_df.columns]
+    if missing:
+        raise ValueError(f"New records are missing columns: {missing}")
+    new_df = new_df[REQUIRED_COLS].dropna(subset=["RiskLevel"]).reset_index(drop=True)
+    if new_df.empty:
+        raise ValueError("No labelled records to train on.")
+    invalid = sorted(set(new_df["RiskLevel"]) - set(RISK_LEVELS), key=str)
+    if invalid:
+        raise ValueError(f"New records have unknown RiskLevel values: {invalid} (expected one of {RISK_LEVELS})")
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    if seed is not None:
+        torch.manual_seed(seed)
+
+    model, cat_maps, num_stats = load_model_and_encoders()
+    with open(ENCODERS_PATH) as f:
+        n_old = json.load(f).get("n_samples")
+    if n_old is None:
+        # Encoders saved before sample counts were recorded: count once.
+        n_old = len(load_data())
+
+    replay = load_replay_buffer(replay_size, rng)
+
+    added = grow_categories(model, cat_maps, new_df)
+    new_stats = merge_num_stats(num_stats, n_old, new_df)
+    rebase_numeric_projections(model, num_stats, new_stats)
+
+    # Every new row is trained on; validation is held out from the replay rows only.
+    replay_rows = replay[REQUIRED_COLS].sample(frac=1.0, random_state=int(rng.integers(0, 2**31 - 1)))
+    n_val = len(replay_rows) // 5
+    val_df = replay_rows.iloc[:n_val]
+    train_df = pd.concat([new_df, replay_rows.iloc[n_val:]], ignore_index=True)
+    x_num, x_cat, y = encode_dataframe(train_df, cat_maps, new_stats)
+    if n_val > 0:
+        x_num_val, x_cat_val, y_val = encode_dataframe(val_df, cat_maps, new_stats)
+    else:
+        x_num_val = x_cat_val = y_val = None
+
+    print(
+        f"Fine-tuning on {len(new_df)} new + {len(train_df) - len(new_df)} replay rows "
+        f"({n_val} replay rows held out for validation) for {epochs} epochs..."
+    )
+    if added:
+        print("New categories:", ", ".join(added))
+    train_transformer(
+        model,
+        x_num,
+        x_cat,
+        y,
+        x_num_val,
+        x_cat_val,
+        y_val,
+        epochs=epochs,
+        batch_size=batch_size,
+        lr=lr,
+    )
+    model.eval()
+
+    n_total = n_old + len(new_df)
+    replay = update_replay_buffer(replay, n_old, new_df, replay_size, rng)
+    replay.to_csv(REPLAY_PATH, index=False)
+    save_model_and_encoders(model, cat_maps, new_stats, n_samples=n_total)
+    if append_to_data:
+        append_to_data_file(new_df)
+    if os.path.exists(STUDENT_PATH):
+        print(f"Note: {STUDENT_PATH} is now stale and will not be served; re-run distill_student.py.")
+
+    print(f"Incremental update done in {time.perf_counter() - start:.1f}s ({n_total} rows seen in total).")
+    return model
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Fine-tune the saved Transformer on newly labelled records.")
+    parser.add_argument("new_records", help="CSV with the same columns as the training data, including RiskLevel.")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=3e-4)
+    parser.add_argument("--replay-size", type=int, default=DEFAULT_REPLAY_SIZE)
+    parser.add_argument("--no-append", action="store_true", help="Do not append the new rows to the data CSV.")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+
+    incremental_update(
+        pd.read_csv(args.new_records),
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        lr=args.lr,
+        replay_size=args.replay_size,
+        append_to_data=not args.no_append,
+        seed=args.seed,
+    )
+
+
+if __name__ == "__main__":
+    main()
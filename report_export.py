@@ -0,0 +1,220 @@
+"""
+Streaming report export with model risk predictions.
+
+Rows are read from the source CSV chunk by chunk, scored with batched
+TabTransformer inference and serialized (CSV or Parquet, optionally gzipped)
+as they go, so memory stays bounded by the chunk size regardless of how many
+rows are exported. export_summary() scores the source in its own pass without
+serializing any rows.
+"""
+import zlib
+from typing import Any, Dict, Iterable, Iterator, Tuple
+
+import numpy as np
+import pandas as pd
+
+from risk_model import (
+    DATA_FILE,
+    TabTransformer,
+    encode_dataframe,
+    predict_proba_batched,
+)
+
+CLASSES = ["Low", "Medium", "High"]
+SOURCE_COLS = ["Age", "Gender", "BMI", "HemoglobinLevel", "IncomeLevel", "Region", "HealthHistory", "RiskLevel"]
+PREDICTION_COLS = ["PredictedRisk", "ProbLow", "ProbMedium", "ProbHigh"]
+EXPORT_COLS = SOURCE_COLS + PREDICTION_COLS
+NUMERIC_COLS = ["Age", "BMI", "HemoglobinLevel", "IncomeLevel", "ProbLow", "ProbMedium", "ProbHigh"]
+DEFAULT_CHUNK_SIZE = 4096
+MAX_CHUNK_SIZE = 65536
+
+# ===================
+# Scoring
+# ===================
+
+def iter_scored_chunks(
+    model: TabTransformer,
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+    source: str = DATA_FILE,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> Iterator[pd.DataFrame]:
+    """
+    Yield source rows with the predicted risk and class probabilities (%), one chunk at a time.
+    """
+    for chunk in pd.read_csv(source, chunksize=chunk_size):
+        if "RiskLevel" not in chunk.columns:
+            chunk["RiskLevel"] = None
+        x_num, x_cat, _ = encode_dataframe(chunk.assign(RiskLevel="Low"), cat_maps, num_stats)
+        probs = np.concatenate(
+            [p.numpy() for _, p in predict_proba_batched(model, x_num, x_cat, chunk_size=chunk_size)]
+        )
+
+        out = chunk[SOURCE_COLS].copy()
+        out["PredictedRisk"] = np.asarray(CLASSES)[probs.argmax(axis=1)]
+        out["ProbLow"] = (probs[:, 0] * 100.0).round(2)
+        out["ProbMedium"] = (probs[:, 1] * 100.0).round(2)
+        out["ProbHigh"] = (probs[:, 2] * 100.0).round(2)
+        yield out
+
+
+class ExportSummary:
+    """
+    Summary statistics accumulated in a single pass over the scored chunks.
+    """
+
+    def __init__(self):
+        self.total = 0
+        self.labelled = {cls: 0 for cls in CLASSES}
+        self.predicted = {cls: 0 for cls in CLASSES}
+        self.prob_sums = {cls: 0.0 for cls in CLASSES}
+        self.agreement = 0
+
+    def update(self, chunk: pd.DataFrame) -> None:
+        self.total += len(chunk)
+        labelled = chunk["RiskLevel"].value_counts()
+        predicted = chunk["PredictedRisk"].value_counts()
+        for cls in CLASSES:
+            self.labelled[cls] += int(labelled.get(cls, 0))
+            self.predicted[cls] += int(predicted.get(cls, 0))
+            self.prob_sums[cls] += float(chunk[f"Prob{cls}"].sum())
+        self.agreement += int((chunk["RiskLevel"] == chunk["PredictedRisk"]).sum())
+
+    def to_dict(self) -> Dict[str, Any]:
+        n = self.total or 1
+        return {
+            "total": self.total,
+            "labelled": dict(self.labelled),
+            "predicted": dict(self.predicted),
+            "mean_probability": {cls: self.prob_sums[cls] / n for cls in CLASSES},
+            "agreement_rate": self.agreement / n,
+        }
+
+
+# ===================
+# Serialization
+# ===================
+
+def stream_csv(chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    """CSV header followed by one encoded block per chunk."""
+    yield (",".join(EXPORT_COLS) + "\n").encode()
+    for chunk in chunks:
+        yield chunk.to_csv(header=False, index=False).encode()
+
+
+class _ChunkSink:
+    """Write-only file object whose buffered bytes are drained after each row group."""
+
+    def __init__(self):
+        self._parts = []
+        self._pos = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        self._parts.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    def writable(self) -> bool:
+        return True
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts = []
+        return data
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:
+        raise RuntimeError("Parquet export requires pyarrow (pip install pyarrow)") from e
+    return pa, pq
+
+
+def _export_schema(pa):
+    """
+    Fixed Parquet schema for EXPORT_COLS. Inferring it per chunk would break on a
+    chunk whose types differ (e.g. integer Age, or an all-null RiskLevel).
+    """
+    return pa.schema(
+        [(col, pa.float64() if col in NUMERIC_COLS else pa.string()) for col in EXPORT_COLS]
+    )
+
+
+def stream_parquet(chunks: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+    """One Parquet row group per chunk (requires pyarrow)."""
+    pa, pq = _require_pyarrow()
+    schema = _export_schema(pa)
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema)
+    for chunk in chunks:
+        chunk = chunk.astype({col: "float64" for col in NUMERIC_COLS})
+        writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def gzip_stream(parts: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip-compress a byte stream on the fly."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for part in parts:
+        data = compressor.compress(part)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(
+    model: TabTransformer,
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+    fmt: str = "csv",
+    compress: bool = False,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    source: str = DATA_FILE,
+) -> Iterator[bytes]:
+    """
+    Scored export as a byte stream.
+    """
+    if fmt not in ("csv", "parquet"):
+        raise ValueError(f"Unsupported export format: {fmt}")
+    if not 1 <= chunk_size <= MAX_CHUNK_SIZE:
+        raise ValueError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+    if fmt == "parquet":
+        # Fail before the response starts rather than mid-stream.
+        _require_pyarrow()
+    chunks = iter_scored_chunks(model, cat_maps, num_stats, source, chunk_size)
+    parts = stream_csv(chunks) if fmt == "csv" else stream_parquet(chunks)
+    return gzip_stream(parts) if compress else parts
+
+
+def export_summary(
+    model: TabTransformer,
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    source: str = DATA_FILE,
+) -> Dict[str, Any]:
+    """
+    Summary statistics of the scored source data, without serializing any rows.
+    This is a separate scoring pass over the source, independent of any export.
+    """
+    summary = ExportSummary()
+    for chunk in iter_scored_chunks(model, cat_maps, num_stats, source, chunk_size):
+        summary.update(chunk)
+    return summary.to_dict()
@@ -0,0 +1,486 @@
+"""
+Inference side of the Risk Prediction Transformer: model definition,
+feature encoding, save/load and prediction helpers.
+
+Imports only torch and numpy so the API can serve predictions without
+pulling in pandas or scikit-learn. Training lives in risk_prediction_transformer.
+"""
+import json
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+DEVICE = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+DATA_FILE = "synthetic_risk_data_transformer.csv"
+
+# ======================
+# Tabular Transformer NN
+# ======================
+
+@dataclass
+class TabularConfig:
+    num_features: List[str]
+    cat_features: List[str]
+    cat_cardinalities: List[int]
+    d_model: int = 32
+    n_heads: int = 4
+    n_layers: int = 2
+    dim_feedforward: int = 64
+    dropout: float = 0.1
+    num_classes: int = 3
+
+class TabTransformer(nn.Module):
+    """
+    Simple Transformer encoder for tabular data.
+
+    Each feature is treated as a token:
+      - Categorical: embedding lookup.
+      - Numerical: projected via linear layer.
+    """
+
+    def __init__(self, config: TabularConfig):
+        super().__init__()
+        self.config = config
+
+        # Embeddings for categorical features
+        self.cat_embeddings = nn.ModuleList(
+            [
+                nn.Embedding(cardinality, config.d_model)
+                for cardinality in config.cat_cardinalities
+            ]
+        )
+
+        # Projection for numerical features (one Linear per numeric)
+        self.num_linears = nn.ModuleList(
+            [nn.Linear(1, config.d_model) for _ in config.num_features]
+        )
+
+        encoder_layer = nn.TransformerEncoderLayer(
+            d_model=config.d_model,
+            nhead=config.n_heads,
+            dim_feedforward=config.dim_feedforward,
+            dropout=config.dropout,
+            batch_first=True,
+        )
+        self.transformer = nn.TransformerEncoder(
+            encoder_layer,
+            num_layers=config.n_layers,
+        )
+
+        self.cls_head = nn.Sequential(
+            nn.LayerNorm(config.d_model),
+            nn.Linear(config.d_model, config.num_classes),
+        )
+
+    def forward(self, x_num: torch.Tensor, x_cat: torch.Tensor) -> torch.Tensor:
+        """
+        x_num: (batch, n_num)
+        x_cat: (batch, n_cat)
+        """
+        tokens: List[torch.Tensor] = []
+
+        # Numerical tokens
+        for i, linear in enumerate(self.num_linears):
+            col = x_num[:, i : i + 1]
+            tokens.append(linear(col))
+
+        # Categorical tokens
+        for i, emb in enumerate(self.cat_embeddings):
+            col = x_cat[:, i]
+            tokens.append(emb(col))
+
+        # Stack tokens into (batch, seq_len, d_model)
+        x = torch.stack(tokens, dim=1)
+
+        # Transformer encoder
+        x = self.transformer(x)
+
+        # Simple mean pooling over tokens
+        pooled = x.mean(dim=1)
+        logits = self.cls_head(pooled)
+        return logits
+
+class CachedContextTabTransformer(nn.Module):
+    """
+    Inference-only wrapper around a trained TabTransformer.
+
+    The categorical tokens only take prod(cat_cardinalities) distinct values
+    (12 for Gender x Region x HealthHistory), so their embeddings and their
+    first-layer query/key/value projections are precomputed for every
+    combination. The numeric tokens' first-layer Q/K/V are folded into one
+    per-feature affine map. A request then computes only the numeric-token path
+    and gathers the cached categorical tensors. Deeper layers see categorical
+    tokens that already attended to the numeric ones, so they run unchanged.
+
+    Call refresh() if the wrapped model's weights change.
+    """
+
+    def __init__(self, model: TabTransformer):
+        super().__init__()
+        first = model.transformer.layers[0]
+        if first.norm_first:
+            raise ValueError("CachedContextTabTransformer requires post-norm encoder layers (norm_first=False)")
+        self.model = model
+        self.config = model.config
+
+        # Mixed-radix strides turning an x_cat row into a combination index.
+        strides = []
+        stride = 1
+        for cardinality in reversed(self.config.cat_cardinalities):
+            strides.append(stride)
+            stride *= cardinality
+        self.n_combos = stride
+        self.register_buffer("cat_strides", torch.tensor(list(reversed(strides)), dtype=torch.long), persistent=False)
+        self.refresh()
+
+    @torch.no_grad()
+    def refresh(self) -> None:
+        """Recompute the categorical lookup tables and the folded numeric projections."""
+        model = self.model
+        config = self.config
+        attn = model.transformer.layers[0].self_attn
+        device = attn.in_proj_weight.device
+
+        # Every categorical combination, in the same order as the stride index.
+        combos = torch.cartesian_prod(
+            *[torch.arange(c, device=device) for c in config.cat_cardinalities]
+        ).reshape(self.n_combos, len(config.cat_cardinalities))
+        cat_tokens = torch.stack(
+            [emb(combos[:, i]) for i, emb in enumerate(model.cat_embeddings)], dim=1
+        )  # (n_combos, n_cat, d_model)
+        cat_qkv = nn.functional.linear(cat_tokens, attn.in_proj_weight, attn.in_proj_bias)
+
+        # Numeric token i is x_i * w_i + b_i, so its Q/K/V are x_i * (W_in w_i) + (W_in b_i + b_in).
+        num_w = torch.stack([lin.weight[:, 0] for lin in model.num_linears])  # (n_num, d_model)
+        num_b = torch.stack([lin.bias for lin in model.num_linears])
+        self.register_buffer("cat_tokens", cat_tokens, persistent=False)
+        self.register_buffer("cat_qkv", cat_qkv, persistent=False)
+        self.register_buffer("num_w", num_w, persistent=False)
+        self.register_buffer("num_b", num_b, persistent=False)
+        self.register_buffer("num_qkv_w", num_w @ attn.in_proj_weight.T, persistent=False)
+        self.register_buffer(
+            "num_qkv_b", nn.functional.linear(num_b, attn.in_proj_weight, attn.in_proj_bias), persistent=False
+        )
+
+    def forward(self, x_num: torch.Tensor, x_cat: torch.Tensor) -> torch.Tensor:
+        """
+        x_num: (batch, n_num)
+        x_cat: (batch, n_cat)
+        """
+        model = self.model
+        layer = model.transformer.layers[0]
+        attn = layer.self_attn
+        batch = x_num.size(0)
+        d_model = self.config.d_model
+        n_heads = attn.num_heads
+
+        combo = (x_cat * self.cat_strides).sum(dim=1)
+        x_col = x_num.unsqueeze(-1)
+        x = torch.cat([x_col * self.num_w + self.num_b, self.cat_tokens[combo]], dim=1)
+        qkv = torch.cat([x_col * self.num_qkv_w + self.num_qkv_b, self.cat_qkv[combo]], dim=1)
+
+        # First encoder layer (post-norm, eval mode) on the assembled tokens.
+        seq_len = x.size(1)
+        q, k, v = qkv.view(batch, seq_len, 3, n_heads, d_model // n_heads).permute(2, 0, 3, 1, 4)
+        ctx = nn.functional.scaled_dot_product_attention(q, k, v)
+        ctx = ctx.transpose(1, 2).reshape(batch, seq_len, d_model)
+        x = layer.norm1(x + attn.out_proj(ctx))
+        x = layer.norm2(x + layer.linear2(layer.activation(layer.linear1(x))))
+
+        for later in model.transformer.layers[1:]:
+            x = later(x)
+        if model.transformer.norm is not None:
+            x = model.transformer.norm(x)
+
+        pooled = x.mean(dim=1)
+        return model.cls_head(pooled)
+
+# =====================
+# Preprocessing helpers
+# =====================
+
+def encode_dataframe(
+    df: "pd.DataFrame",
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """
+    Encode dataframe into tensors for Transformer.
+    """
+    label_map = {"Low": 0, "Medium": 1, "High": 2}
+
+    num_cols = ["Age", "BMI", "HemoglobinLevel", "IncomeLevel"]
+    cat_cols = ["Gender", "Region", "HealthHistory"]
+
+    # Numerical matrix
+    num_arr = []
+    for col in num_cols:
+        mean, std = num_stats[col]
+        vals = df[col].astype(float).fillna(mean).to_numpy()
+        vals = (vals - mean) / std
+        num_arr.append(vals)
+    num_mat = np.stack(num_arr, axis=1)
+
+    # Categorical matrix
+    cat_arr = []
+    for col in cat_cols:
+        mapping = cat_maps[col]
+        vals = (
+            df[col]
+            .fillna(next(iter(mapping)))
+            .apply(lambda v: mapping.get(v, 0))
+            .to_numpy()
+        )
+        cat_arr.append(vals)
+    cat_mat = np.stack(cat_arr, axis=1)
+
+    # Labels
+    y = df["RiskLevel"].map(label_map).to_numpy()
+
+    x_num = torch.tensor(num_mat, dtype=torch.float32)
+    x_cat = torch.tensor(cat_mat, dtype=torch.long)
+    y_t = torch.tensor(y, dtype=torch.long)
+
+    return x_num, x_cat, y_t
+
+def encode_records(
+    records: List[Dict[str, Any]],
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+) -> Tuple[torch.Tensor, torch.Tensor]:
+    """
+    Encode raw user dicts into (x_num, x_cat) like encode_dataframe, without pandas.
+    Used on the request path where building a DataFrame dominates the cost.
+    """
+    num_cols = ["Age", "BMI", "HemoglobinLevel", "IncomeLevel"]
+    cat_cols = ["Gender", "Region", "HealthHistory"]
+
+    num_rows = []
+    cat_rows = []
+    for rec in records:
+        num_row = []
+        for col in num_cols:
+            mean, std = num_stats[col]
+            val = rec.get(col)
+            val = mean if val is None or val != val else float(val)
+            num_row.append((val - mean) / std)
+        num_rows.append(num_row)
+
+        cat_row = []
+        for col in cat_cols:
+            mapping = cat_maps[col]
+            val = rec.get(col)
+            if val is None or val != val:
+                val = next(iter(mapping))
+            cat_row.append(mapping.get(val, 0))
+        cat_rows.append(cat_row)
+
+    x_num = torch.tensor(num_rows, dtype=torch.float32).reshape(len(records), len(num_cols))
+    x_cat = torch.tensor(cat_rows, dtype=torch.long).reshape(len(records), len(cat_cols))
+    return x_num, x_cat
+
+# =================
+# Batched inference
+# =================
+
+def predict_proba_batched(
+    model: TabTransformer,
+    x_num: torch.Tensor,
+    x_cat: torch.Tensor,
+    chunk_size: int = 1024,
+) -> Iterator[Tuple[int, torch.Tensor]]:
+    """
+    Yield (start, probs) for consecutive chunks of at most chunk_size rows,
+    so memory stays bounded by the chunk rather than the whole input.
+    """
+    model.eval()
+    with torch.no_grad():
+        for start in range(0, x_num.size(0), chunk_size):
+            logits = model(
+                x_num[start : start + chunk_size].to(DEVICE),
+                x_cat[start : start + chunk_size].to(DEVICE),
+            )
+            yield start, torch.softmax(logits, dim=1).cpu()
+
+# ==========================
+# Save / Load model for API
+# ==========================
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(MODEL_DIR, "model_state.pt")
+ENCODERS_PATH = os.path.join(MODEL_DIR, "encoders.json")
+
+
+def save_model_and_encoders(
+    model: TabTransformer,
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+    n_samples: Optional[int] = None,
+) -> None:
+    """
+    Save model state and encoders to disk.
+    n_samples (rows num_stats were computed over) is needed for incremental updates.
+    """
+    torch.save(model.state_dict(), MODEL_PATH)
+    encoders_serial: Dict[str, Any] = {
+        "cat_maps": cat_maps,
+        "num_stats": {k: list(v) for k, v in num_stats.items()},
+    }
+    if n_samples is not None:
+        encoders_serial["n_samples"] = int(n_samples)
+    with open(ENCODERS_PATH, "w") as f:
+        json.dump(encoders_serial, f, indent=2)
+
+
+def load_model_and_encoders(
+    cache_cat_context: bool = False,
+) -> Tuple[TabTransformer, Dict[str, Dict[str, int]], Dict[str, Tuple[float, float]]]:
+    """
+    Load model and encoders from disk.
+    With cache_cat_context=True the model is wrapped in CachedContextTabTransformer for inference.
+    """
+    with open(ENCODERS_PATH) as f:
+        enc = json.load(f)
+    cat_maps = enc["cat_maps"]
+    num_stats_loaded = {k: (v[0], v[1]) for k, v in enc["num_stats"].items()}
+
+    # Cardinalities come from the saved encoders, which may have grown since training.
+    cat_cols = ["Gender", "Region", "HealthHistory"]
+    cat_cardinalities = [len(cat_maps[col]) for col in cat_cols]
+    config = TabularConfig(
+        num_features=["Age", "BMI", "HemoglobinLevel", "IncomeLevel"],
+        cat_features=cat_cols,
+        cat_cardinalities=cat_cardinalities,
+        d_model=32,
+        n_heads=4,
+        n_layers=2,
+        dim_feedforward=64,
+        dropout=0.1,
+        num_classes=3,
+    )
+    model = TabTransformer(config)
+    model.load_state_dict(torch.load(MODEL_PATH, map_location=DEVICE))
+    model.eval()
+
+    if cache_cat_context:
+        model = CachedContextTabTransformer(model).eval()
+    return model, cat_maps, num_stats_loaded
+
+
+def predict_from_dict(
+    model: TabTransformer,
+    cat_maps: Dict[str, Dict[str, int]],
+    num_stats: Dict[str, Tuple[float, float]],
+    user: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Predict risk for a single user dict. Returns API-ready structure.
+    user keys: Age, Gender, BMI, HemoglobinLevel, IncomeLevel, Region, HealthHistory
+    """
+    x_num, x_cat = encode_records([user], cat_maps, num_stats)
+
+    model.eval()
+    with torch.no_grad():
+        logits = model(x_num.to(DEVICE), x_cat.to(DEVICE))
+        probs = torch.softmax(logits, dim=1)[0].cpu().numpy()
+
+    return build_prediction_response(probs, user, num_stats)
+
+
+def build_prediction_response(
+    probs: np.ndarray,
+    user: Dict[str, Any],
+    num_stats: Dict[str, Tuple[float, float]],
+    model_name: str = "Transformer model",
+) -> Dict[str, Any]:
+    """
+    Turn class probabilities (Low, Medium, High) for one user into the API response.
+    """
+    classes = ["Low", "Medium", "High"]
+    pred_idx = int(np.argmax(probs))
+    pred_label = classes[pred_idx]
+    confidence = float(probs[pred_idx]) * 100.0
+
+    prob_dict = {cls: float(p * 100.0) for cls, p in zip(classes, probs)}
+
+    num_cols = ["Age", "BMI", "HemoglobinLevel", "IncomeLevel"]
+    contrib = {}
+    for col in num_cols:
+        mean, std = num_stats[col]
+        val = float(user[col]) if isinstance(user[col], (int, float)) else float(user[col])
+        z = abs((val - mean) / std) if std else 0.0
+        contrib[col] = float(z)
+    s = sum(contrib.values()) or 1.0
+    contrib = {k: v / s * 100.0 for k, v in contrib.items()}
+
+    # Map to API format (LOW, MODERATE, HIGH)
+    api_risk_map = {"Low": "LOW", "Medium": "MODERATE", "High": "HIGH"}
+    api_risk = api_risk_map[pred_label]
+
+    # Build factor impacts for API
+    factors = []
+    bmi = float(user.get("BMI", 22))
+    hb = float(user.get("HemoglobinLevel", 13))
+    age = int(user.get("Age", 30))
+    income = float(user.get("IncomeLevel", 50000))
+    has_history = str(user.get("HealthHistory", "No")).lower() in ("yes", "y")
+
+    factors.append({
+        "label": "BMI Status",
+        "impact": "Underweight — High Impact" if bmi < 18.5 else "Obese — Moderate Impact" if bmi > 30 else "Overweight — Low Impact" if bmi > 25 else "Normal — Low Impact",
+    })
+    factors.append({
+        "label": "Hemoglobin Level",
+        "impact": "Severely Low — Critical" if hb < 10 else "Below Normal — Moderate" if hb < 12 else "Normal — Low Impact",
+    })
+    factors.append({
+        "label": "Age Factor",
+        "impact": "Senior — Elevated risk" if age >= 65 else "Middle-aged — Moderate" if age >= 45 else "Young — Low Impact",
+    })
+    factors.append({
+        "label": "Income Level",
+        "impact": "Low Income — High Impact" if income < 30000 else "Medium — Moderate" if income < 60000 else "Higher — Low Impact",
+    })
+    factors.append({
+        "label": "Health History",
+        "impact": "Positive — Elevated Risk" if has_history else "No history — Low Impact",
+    })
+
+    explanation = (
+        f"{model_name} prediction: {pred_label} risk with {confidence:.1f}% confidence. "
+        f"Probabilities: Low {prob_dict['Low']:.1f}%, Medium {prob_dict['Medium']:.1f}%, High {prob_dict['High']:.1f}%."
+    )
+
+    return {
+        "risk": api_risk,
+        "probability": round(confidence, 1),
+        "explanation": explanation,
+        "factors": factors,
+        "probabilities": {api_risk_map[k]: v for k, v in prob_dict.items()},
+    }
+
+
+def warmup_model(
+    model: TabTransformer,
+    batch_sizes: Tuple[int, ...] = (1, 8, 64, 256),
+    repeats: int = 2,
+) -> None:
+    """
+    Run dummy batches at common sizes so the first real request does not pay
+    for first-forward kernel selection and allocator growth.
+    """
+    config = model.config
+    model.eval()
+    with torch.no_grad():
+        for batch_size in batch_sizes:
+            x_num = torch.zeros(batch_size, len(config.num_features), device=DEVICE)
+            x_cat = torch.zeros(batch_size, len(config.cat_features), dtype=torch.long, device=DEVICE)
+            for _ in range(repeats):
+                model(x_num, x_cat)
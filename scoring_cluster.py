@@ -0,0 +1,612 @@
+"""
+Process-pool scoring service for scaling batched TabTransformer inference
+across nodes, runnable entirely on one Linux box.
+
+- worker: loads the model and scores pre-encoded batches received over a
+  Unix or TCP socket.
+- router: accepts the same protocol from clients and forwards each batch to
+  the healthy worker with the fewest outstanding requests, health-checking
+  workers in the background and retrying a batch once if a worker dies,
+  fails a health check or does not answer within the request timeout.
+- local: starts N local worker processes (standing in for remote nodes), a
+  router, and runs a load test against it.
+
+Addresses are "unix:/path/to.sock" or "tcp:host:port".
+
+Wire protocol: every frame is a little-endian uint32 length followed by a
+17-byte header (msg_type u8, request_id u64, n_rows u32, a u16, b u16) and
+a body. SCORE bodies are x_num as float32 (n_rows x a) followed by x_cat as
+int64 (n_rows x b); RESULT bodies are float32 probabilities (n_rows x a).
+
+    python scoring_cluster.py local --workers 4 --batch-size 256 --concurrency 16
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import shutil
+import signal
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+
+MSG_SCORE = 1
+MSG_RESULT = 2
+MSG_PING = 3
+MSG_PONG = 4
+MSG_ERROR = 5
+
+LENGTH = struct.Struct("<I")
+HEADER = struct.Struct("<BQIHH")
+MAX_FRAME_BYTES = 256 * 1024 * 1024
+
+Frame = Tuple[int, int, int, int, int, bytes]
+
+# =====================
+# Framing / transport
+# =====================
+
+def encode_frame(msg_type: int, request_id: int, n_rows: int = 0, a: int = 0, b: int = 0, body: bytes = b"") -> bytes:
+    return LENGTH.pack(HEADER.size + len(body)) + HEADER.pack(msg_type, request_id, n_rows, a, b) + body
+
+
+async def read_frame(reader: asyncio.StreamReader) -> Frame:
+    """Read one frame; raises asyncio.IncompleteReadError on EOF."""
+    (length,) = LENGTH.unpack(await reader.readexactly(LENGTH.size))
+    if length < HEADER.size or length > MAX_FRAME_BYTES:
+        raise ValueError(f"Invalid frame length: {length}")
+    payload = await reader.readexactly(length)
+    msg_type, request_id, n_rows, a, b = HEADER.unpack_from(payload)
+    return msg_type, request_id, n_rows, a, b, payload[HEADER.size :]
+
+
+def pack_batch(x_num: np.ndarray, x_cat: np.ndarray) -> Tuple[int, int, int, bytes]:
+    """(n_rows, n_num, n_cat, body) of a SCORE frame for pre-encoded arrays."""
+    x_num = np.ascontiguousarray(x_num, dtype="<f4")
+    x_cat = np.ascontiguousarray(x_cat, dtype="<i8")
+    n_rows, n_num = x_num.shape
+    return n_rows, n_num, x_cat.shape[1], x_num.tobytes() + x_cat.tobytes()
+
+
+def decode_score_request(frame: Frame) -> Tuple[np.ndarray, np.ndarray]:
+    _, _, n_rows, n_num, n_cat, body = frame
+    split = n_rows * n_num * 4
+    if len(body) != split + n_rows * n_cat * 8:
+        raise ValueError("SCORE body size does not match its header")
+    x_num = np.frombuffer(body, dtype="<f4", count=n_rows * n_num).reshape(n_rows, n_num)
+    x_cat = np.frombuffer(body, dtype="<i8", offset=split).reshape(n_rows, n_cat)
+    return x_num, x_cat
+
+
+def decode_result(frame: Frame) -> np.ndarray:
+    msg_type, _, n_rows, n_classes, _, body = frame
+    if msg_type == MSG_ERROR:
+        raise RuntimeError(body.decode("utf-8", "replace"))
+    return np.frombuffer(body, dtype="<f4").reshape(n_rows, n_classes)
+
+
+async def start_server(address: str, handler) -> asyncio.AbstractServer:
+    kind, _, rest = address.partition(":")
+    if kind == "unix":
+        if os.path.exists(rest):
+            os.unlink(rest)
+        return await asyncio.start_unix_server(handler, path=rest)
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return await asyncio.start_server(handler, host or "127.0.0.1", int(port))
+    raise ValueError(f"Unsupported address: {address}")
+
+
+async def open_connection(address: str) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter]:
+    kind, _, rest = address.partition(":")
+    if kind == "unix":
+        return await asyncio.open_unix_connection(rest)
+    if kind == "tcp":
+        host, _, port = rest.rpartition(":")
+        return await asyncio.open_connection(host or "127.0.0.1", int(port))
+    raise ValueError(f"Unsupported address: {address}")
+
+
+class MultiplexedConnection:
+    """
+    One connection carrying many in-flight requests, matched to responses by request_id.
+    """
+
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.reader = reader
+        self.writer = writer
+        self.pending: Dict[int, asyncio.Future] = {}
+        # Requests the caller gave up on (timeout/cancel) that the peer may still be working on.
+        self.abandoned: Set[int] = set()
+        self._ids = itertools.count(1)
+        self._reader_task = asyncio.get_running_loop().create_task(self._read_loop())
+
+    @classmethod
+    async def connect(cls, address: str) -> "MultiplexedConnection":
+        reader, writer = await open_connection(address)
+        return cls(reader, writer)
+
+    @property
+    def closed(self) -> bool:
+        return self._reader_task.done()
+
+    @property
+    def in_flight(self) -> int:
+        """Requests sent and not yet answered, including abandoned ones."""
+        return len(self.pending) + len(self.abandoned)
+
+    async def _read_loop(self) -> None:
+        error: BaseException = ConnectionError("connection closed")
+        try:
+            while True:
+                frame = await read_frame(self.reader)
+                self.abandoned.discard(frame[1])
+                future = self.pending.pop(frame[1], None)
+                if future is not None and not future.done():
+                    future.set_result(frame)
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError) as e:
+            error = ConnectionError(f"connection lost: {e}")
+        finally:
+            for future in self.pending.values():
+                if not future.done():
+                    future.set_exception(error)
+            self.pending.clear()
+            self.abandoned.clear()
+            self.writer.close()
+
+    async def request(self, msg_type: int, n_rows: int = 0, a: int = 0, b: int = 0, body: bytes = b"") -> Frame:
+        if self.closed:
+            raise ConnectionError("connection closed")
+        request_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self.pending[request_id] = future
+        try:
+            self.writer.write(encode_frame(msg_type, request_id, n_rows, a, b, body))
+            await self.writer.drain()
+            return await future
+        finally:
+            # Also drops the entry when the caller times out or is cancelled (which
+            # cancels the future too); the request then counts as abandoned until
+            # the peer answers it.
+            self.pending.pop(request_id, None)
+            if (future.cancelled() or not future.done()) and not self.closed:
+                self.abandoned.add(request_id)
+
+    async def close(self) -> None:
+        """Close the connection; requests still pending fail with ConnectionError."""
+        self.writer.close()
+        self._reader_task.cancel()
+        try:
+            await self._reader_task
+        except asyncio.CancelledError:
+            pass
+
+# =====================
+# Worker
+# =====================
+
+async def run_worker(address: str, threads: int) -> None:
+    """Serve batched model scoring on address until cancelled."""
+    import torch
+
+    from risk_model import load_model_and_encoders, warmup_model
+
+    torch.set_num_threads(threads)
+    model, _, _ = load_model_and_encoders(cache_cat_context=True)
+    warmup_model(model)
+    # One scoring thread: batches run one at a time while the loop keeps answering pings.
+    executor = ThreadPoolExecutor(max_workers=1)
+    loop = asyncio.get_running_loop()
+
+    def score(frame: Frame) -> bytes:
+        x_num, x_cat = decode_score_request(frame)
+        with torch.no_grad():
+            logits = model(torch.from_numpy(x_num.copy()), torch.from_numpy(x_cat.copy()))
+            probs = torch.softmax(logits, dim=1).numpy().astype("<f4")
+        return encode_frame(MSG_RESULT, frame[1], probs.shape[0], probs.shape[1], 0, probs.tobytes())
+
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        lock = asyncio.Lock()
+
+        async def reply(frame: Frame) -> None:
+            try:
+                out = await loop.run_in_executor(executor, score, frame)
+            except Exception as e:
+                out = encode_frame(MSG_ERROR, frame[1], body=str(e).encode())
+            async with lock:
+                writer.write(out)
+                await writer.drain()
+
+        tasks = set()
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if frame[0] == MSG_PING:
+                    async with lock:
+                        writer.write(encode_frame(MSG_PONG, frame[1]))
+                        await writer.drain()
+                elif frame[0] == MSG_SCORE:
+                    task = loop.create_task(reply(frame))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+                else:
+                    async with lock:
+                        writer.write(encode_frame(MSG_ERROR, frame[1], body=b"unknown message type"))
+                        await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    server = await start_server(address, handle)
+    print(f"Scoring worker {os.getpid()} listening on {address} ({threads} torch threads)", flush=True)
+    async with server:
+        await server.serve_forever()
+
+# =====================
+# Router
+# =====================
+
+def _probe_request(frame: Frame) -> Optional[Tuple[int, int, int, int, bytes]]:
+    """(msg_type, n_rows, a, b, body) scoring only the first row of a SCORE frame, if it is one."""
+    if frame[0] != MSG_SCORE or frame[2] == 0:
+        return None
+    try:
+        x_num, x_cat = decode_score_request(frame)
+    except ValueError:
+        return None
+    n_rows, n_num, n_cat, body = pack_batch(x_num[:1], x_cat[:1])
+    return MSG_SCORE, n_rows, n_num, n_cat, body
+
+
+class WorkerHandle:
+    def __init__(self, address: str):
+        self.address = address
+        self.conn: Optional[MultiplexedConnection] = None
+        self.healthy = False
+        self.served = 0
+        self.failures = 0
+        # Set after a request timed out: a 1-row SCORE that must succeed before
+        # the worker is routed to again (its event loop may still answer pings).
+        self.probe: Optional[Tuple[int, int, int, int, bytes]] = None
+
+    @property
+    def outstanding(self) -> int:
+        return self.conn.in_flight if self.conn is not None else 0
+
+    @property
+    def available(self) -> bool:
+        return self.healthy and self.probe is None and self.conn is not None and not self.conn.closed
+
+
+class Router:
+    """
+    Least-outstanding-requests load balancer in front of scoring workers.
+    """
+
+    def __init__(
+        self,
+        worker_addresses: List[str],
+        health_interval: float = 1.0,
+        health_timeout: float = 2.0,
+        request_timeout: float = 30.0,
+    ):
+        self.workers = [WorkerHandle(addr) for addr in worker_addresses]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.request_timeout = request_timeout
+        self._rr = itertools.count()
+
+    async def _check(self, worker: WorkerHandle) -> None:
+        try:
+            if worker.conn is None or worker.conn.closed:
+                worker.conn = await asyncio.wait_for(MultiplexedConnection.connect(worker.address), self.health_timeout)
+            if worker.probe is not None:
+                # A ping only shows the worker's event loop is alive; after a timeout,
+                # require a batch scored through its executor.
+                frame = await asyncio.wait_for(worker.conn.request(*worker.probe), self.health_timeout)
+                if frame[0] != MSG_RESULT:
+                    raise ConnectionError("scoring probe failed")
+                worker.probe = None
+            else:
+                frame = await asyncio.wait_for(worker.conn.request(MSG_PING), self.health_timeout)
+                if frame[0] != MSG_PONG:
+                    raise ConnectionError("unexpected health-check reply")
+            if not worker.healthy:
+                print(f"Worker {worker.address} is healthy", flush=True)
+            worker.healthy = True
+        except (OSError, ConnectionError, asyncio.TimeoutError) as e:
+            if worker.healthy:
+                print(f"Worker {worker.address} failed health check: {e!r}", flush=True)
+            worker.healthy = False
+            worker.failures += 1
+            # Fail requests stuck on a hung worker so score() retries them elsewhere;
+            # the next check reconnects.
+            if worker.conn is not None:
+                await worker.conn.close()
+                worker.conn = None
+
+    async def health_loop(self) -> None:
+        while True:
+            await asyncio.gather(*(self._check(w) for w in self.workers))
+            await asyncio.sleep(self.health_interval)
+
+    def pick(self, exclude: Optional[WorkerHandle] = None) -> Optional[WorkerHandle]:
+        candidates = [w for w in self.workers if w.available and w is not exclude]
+        if not candidates:
+            return None
+        # Rotate the starting point so ties are spread round-robin.
+        offset = next(self._rr) % len(candidates)
+        rotated = candidates[offset:] + candidates[:offset]
+        return min(rotated, key=lambda w: w.outstanding)
+
+    async def score(self, frame: Frame, retries: int = 1) -> Frame:
+        msg_type, _, n_rows, a, b, body = frame
+        last: Optional[WorkerHandle] = None
+        for _ in range(retries + 1):
+            worker = self.pick(exclude=last)
+            if worker is None:
+                break
+            try:
+                reply = await asyncio.wait_for(
+                    worker.conn.request(msg_type, n_rows, a, b, body), self.request_timeout
+                )
+                worker.served += 1
+                return reply
+            except asyncio.TimeoutError:
+                print(f"Worker {worker.address} timed out; out of rotation until a scoring probe succeeds", flush=True)
+                worker.healthy = False
+                worker.probe = _probe_request(frame)
+                last = worker
+            except (ConnectionError, OSError):
+                worker.healthy = False
+                last = worker
+        return (MSG_ERROR, 0, 0, 0, 0, b"no healthy scoring worker available")
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        lock = asyncio.Lock()
+        loop = asyncio.get_running_loop()
+
+        async def forward(frame: Frame) -> None:
+            if frame[0] == MSG_PING:
+                healthy = sum(w.available for w in self.workers)
+                reply: Frame = (MSG_PONG if healthy else MSG_ERROR, 0, healthy, 0, 0, b"")
+            else:
+                reply = await self.score(frame)
+            async with lock:
+                writer.write(encode_frame(reply[0], frame[1], reply[2], reply[3], reply[4], reply[5]))
+                await writer.drain()
+
+        tasks = set()
+        try:
+            while True:
+                task = loop.create_task(forward(await read_frame(reader)))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [
+            {"address": w.address, "healthy": w.healthy, "served": w.served, "failures": w.failures}
+            for w in self.workers
+        ]
+
+
+async def run_router(address: str, worker_addresses: List[str], request_timeout: float = 30.0) -> None:
+    router = Router(worker_addresses, request_timeout=request_timeout)
+    health = asyncio.get_running_loop().create_task(router.health_loop())
+    server = await start_server(address, router.handle_client)
+    print(f"Router listening on {address} with {len(worker_addresses)} workers", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        health.cancel()
+
+# =====================
+# Client / load test
+# =====================
+
+class ScoringClient:
+    """Async client for a worker or the router; requests are pipelined on one connection."""
+
+    def __init__(self, conn: MultiplexedConnection):
+        self.conn = conn
+
+    @classmethod
+    async def connect(cls, address: str) -> "ScoringClient":
+        return cls(await MultiplexedConnection.connect(address))
+
+    async def score(self, x_num: np.ndarray, x_cat: np.ndarray) -> np.ndarray:
+        n_rows, n_num, n_cat, body = pack_batch(x_num, x_cat)
+        return decode_result(await self.conn.request(MSG_SCORE, n_rows, n_num, n_cat, body))
+
+    async def close(self) -> None:
+        await self.conn.close()
+
+
+def load_encoded_rows(n_rows: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Encode n_rows rows (resampled from the data CSV) with the saved encoders."""
+    from risk_model import encode_dataframe, load_model_and_encoders
+    from risk_prediction_transformer import load_data
+
+    _, cat_maps, num_stats = load_model_and_encoders()
+    df = load_data().sample(n=n_rows, replace=True, random_state=0).reset_index(drop=True)
+    x_num, x_cat, _ = encode_dataframe(df, cat_maps, num_stats)
+    return x_num.numpy(), x_cat.numpy()
+
+
+async def load_test(
+    address: str,
+    batch_size: int,
+    concurrency: int,
+    duration: float,
+    connections: int = 4,
+) -> Dict[str, Any]:
+    """Send batches of batch_size rows with `concurrency` in-flight requests for `duration` seconds."""
+    x_num, x_cat = load_encoded_rows(batch_size * 16)
+    clients = [await ScoringClient.connect(address) for _ in range(connections)]
+    latencies: List[float] = []
+    errors = 0
+    stop_at = time.monotonic() + duration
+
+    async def run(i: int) -> None:
+        nonlocal errors
+        client = clients[i % len(clients)]
+        j = i
+        while time.monotonic() < stop_at:
+            start = (j % 16) * batch_size
+            t0 = time.perf_counter()
+            try:
+                await client.score(x_num[start : start + batch_size], x_cat[start : start + batch_size])
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+            except (RuntimeError, ConnectionError):
+                errors += 1
+                await asyncio.sleep(0.05)
+            j += 1
+
+    t_start = time.perf_counter()
+    await asyncio.gather(*(run(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - t_start
+    for client in clients:
+        await client.close()
+
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "batch_size": batch_size,
+        "concurrency": concurrency,
+        "duration_s": elapsed,
+        "requests": n,
+        "errors": errors,
+        "requests_per_s": n / elapsed,
+        "rows_per_s": n * batch_size / elapsed,
+        "median_ms": latencies[n // 2] if n else None,
+        "p95_ms": latencies[int(0.95 * (n - 1))] if n else None,
+    }
+
+# =====================
+# Local cluster
+# =====================
+
+def _wait_for_address(address: str, timeout: float) -> None:
+    async def probe() -> None:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                conn = await MultiplexedConnection.connect(address)
+                frame = await conn.request(MSG_PING)
+                await conn.close()
+                if frame[0] == MSG_PONG:
+                    return
+            except (OSError, ConnectionError):
+                pass
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"{address} did not come up within {timeout:.0f}s")
+            await asyncio.sleep(0.2)
+
+    asyncio.run(probe())
+
+
+def spawn(args: List[str]) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable, os.path.abspath(__file__), *args], start_new_session=True)
+
+
+def run_local(
+    n_workers: int,
+    threads_per_worker: int,
+    batch_size: int,
+    concurrency: int,
+    duration: float,
+    output: Optional[str],
+) -> Dict[str, Any]:
+    """
+    Start n_workers worker processes and a router on this machine, load test the router, tear down.
+    """
+    sock_dir = tempfile.mkdtemp(prefix="risk-scoring-")
+    worker_addresses = [f"unix:{os.path.join(sock_dir, f'worker-{i}.sock')}" for i in range(n_workers)]
+    router_address = f"unix:{os.path.join(sock_dir, 'router.sock')}"
+
+    procs = [spawn(["worker", "--address", addr, "--threads", str(threads_per_worker)]) for addr in worker_addresses]
+    try:
+        for addr in worker_addresses:
+            _wait_for_address(addr, timeout=120.0)
+        procs.append(spawn(["router", "--address", router_address, "--workers", *worker_addresses]))
+        _wait_for_address(router_address, timeout=30.0)
+
+        print(f"Load testing {n_workers} workers x {threads_per_worker} threads for {duration:.0f}s...")
+        result = asyncio.run(load_test(router_address, batch_size, concurrency, duration))
+        result.update({"workers": n_workers, "threads_per_worker": threads_per_worker})
+    finally:
+        for proc in procs:
+            proc.send_signal(signal.SIGTERM)
+        for proc in procs:
+            try:
+                proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+        shutil.rmtree(sock_dir, ignore_errors=True)
+
+    print(json.dumps(result, indent=2))
+    if output:
+        with open(output, "w") as f:
+            json.dump(result, f, indent=2)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Scale-out scoring workers and router for the Transformer.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_worker = sub.add_parser("worker", help="Serve model scoring on a socket.")
+    p_worker.add_argument("--address", required=True)
+    p_worker.add_argument("--threads", type=int, default=1)
+
+    p_router = sub.add_parser("router", help="Balance batches across workers.")
+    p_router.add_argument("--address", required=True)
+    p_router.add_argument("--workers", nargs="+", required=True)
+    p_router.add_argument("--request-timeout", type=float, default=30.0, help="Seconds before a batch is retried elsewhere.")
+
+    p_load = sub.add_parser("loadtest", help="Load test a running router or worker.")
+    p_load.add_argument("--address", required=True)
+
+    p_local = sub.add_parser("local", help="Start local workers + router and load test them.")
+    p_local.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    p_local.add_argument("--threads-per-worker", type=int, default=1)
+    p_local.add_argument("--output", help="Write the load-test result as JSON.")
+
+    for p in (p_load, p_local):
+        p.add_argument("--batch-size", type=int, default=256)
+        p.add_argument("--concurrency", type=int, default=16)
+        p.add_argument("--duration", type=float, default=10.0)
+
+    args = parser.parse_args()
+    if args.command == "worker":
+        asyncio.run(run_worker(args.address, args.threads))
+    elif args.command == "router":
+        asyncio.run(run_router(args.address, args.workers, args.request_timeout))
+    elif args.command == "loadtest":
+        print(json.dumps(asyncio.run(load_test(args.address, args.batch_size, args.concurrency, args.duration)), indent=2))
+    else:
+        run_local(
+            args.workers,
+            args.threads_per_worker,
+            args.batch_size,
+            args.concurrency,
+            args.duration,
+            args.output,
+        )
+
+
+if __name__ == "__main__":
+    main()
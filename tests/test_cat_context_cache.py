@@ -0,0 +1,59 @@
+import os
+import sys
+
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from risk_model import CachedContextTabTransformer, TabTransformer, TabularConfig
+
+
+def _model() -> TabTransformer:
+    torch.manual_seed(0)
+    config = TabularConfig(
+        num_features=["Age", "BMI", "HemoglobinLevel", "IncomeLevel"],
+        cat_features=["Gender", "Region", "HealthHistory"],
+        cat_cardinalities=[2, 3, 2],
+    )
+    return TabTransformer(config).eval()
+
+
+def _inputs(batch: int):
+    gen = torch.Generator().manual_seed(1)
+    x_num = torch.randn(batch, 4, generator=gen)
+    x_cat = torch.stack(
+        [torch.randint(0, c, (batch,), generator=gen) for c in (2, 3, 2)], dim=1
+    )
+    return x_num, x_cat
+
+
+def test_cached_forward_matches_full_forward():
+    model = _model()
+    cached = CachedContextTabTransformer(model).eval()
+    x_num, x_cat = _inputs(512)
+    with torch.no_grad():
+        expected = model(x_num, x_cat)
+        actual = cached(x_num, x_cat)
+    assert torch.allclose(actual, expected, atol=1e-5)
+
+
+def test_every_categorical_combination_matches():
+    model = _model()
+    cached = CachedContextTabTransformer(model).eval()
+    assert cached.n_combos == 12
+    x_cat = torch.cartesian_prod(torch.arange(2), torch.arange(3), torch.arange(2))
+    x_num = torch.zeros(x_cat.size(0), 4)
+    with torch.no_grad():
+        assert torch.allclose(cached(x_num, x_cat), model(x_num, x_cat), atol=1e-5)
+
+
+def test_refresh_picks_up_new_weights():
+    model = _model()
+    cached = CachedContextTabTransformer(model).eval()
+    with torch.no_grad():
+        model.cat_embeddings[1].weight.add_(0.5)
+        model.num_linears[0].bias.add_(0.25)
+    cached.refresh()
+    x_num, x_cat = _inputs(64)
+    with torch.no_grad():
+        assert torch.allclose(cached(x_num, x_cat), model(x_num, x_cat), atol=1e-5)
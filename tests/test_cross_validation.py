@@ -0,0 +1,51 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+from sklearn.metrics import precision_recall_fscore_support
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cross_validation import CLASSES, metrics_from_confusion, run_cross_validation
+from risk_prediction_transformer import generate_synthetic_data
+
+
+def test_metrics_from_confusion_match_sklearn():
+    rng = np.random.default_rng(0)
+    y_true = rng.integers(0, 3, size=200)
+    y_pred = np.where(rng.random(200) < 0.6, y_true, rng.integers(0, 3, size=200))
+    cm = np.bincount(y_true * 3 + y_pred, minlength=9).reshape(3, 3)
+
+    metrics = metrics_from_confusion(cm)
+
+    precision, recall, f1, support = precision_recall_fscore_support(y_true, y_pred, labels=[0, 1, 2])
+    for i, cls in enumerate(CLASSES):
+        assert metrics["per_class"][cls]["precision"] == pytest.approx(precision[i])
+        assert metrics["per_class"][cls]["recall"] == pytest.approx(recall[i])
+        assert metrics["per_class"][cls]["f1"] == pytest.approx(f1[i])
+        assert metrics["per_class"][cls]["support"] == support[i]
+    assert metrics["accuracy"] == pytest.approx(float((y_true == y_pred).mean()))
+    assert metrics["macro_f1"] == pytest.approx(f1.mean())
+
+
+def test_two_fold_run_covers_every_row_once():
+    df = generate_synthetic_data(n_samples=100, seed=0)
+    # A small eval chunk exercises the chunked confusion-matrix accumulation.
+    report = run_cross_validation(
+        df, n_folds=2, n_workers=2, threads_per_worker=1, epochs=1, eval_chunk_size=7, report_path=None
+    )
+
+    pooled = np.array(report["pooled"]["confusion_matrix"])
+    assert pooled.sum() == len(df)
+    assert [fold["n_test"] for fold in report["folds"]] == [50, 50]
+
+    class_counts = df["RiskLevel"].value_counts()
+    for fold in report["folds"]:
+        assert np.array(fold["confusion_matrix"]).sum() == fold["n_test"]
+        for cls in CLASSES:
+            # Stratified: each fold holds out half of every class (rounded either way).
+            support = fold["per_class"][cls]["support"]
+            assert support in (class_counts[cls] // 2, (class_counts[cls] + 1) // 2)
+    for cls in CLASSES:
+        assert report["pooled"]["per_class"][cls]["support"] == class_counts[cls]
@@ -0,0 +1,164 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import distill_student
+import incremental_update
+import risk_model
+import risk_prediction_transformer
+from incremental_update import (
+    CAT_COLS,
+    NUM_COLS,
+    grow_categories,
+    incremental_update as run_incremental_update,
+    merge_num_stats,
+    rebase_numeric_projections,
+    update_replay_buffer,
+)
+from risk_model import TabTransformer, TabularConfig, encode_dataframe, save_model_and_encoders
+from risk_prediction_transformer import build_encoders, generate_synthetic_data
+
+
+def _model(cat_maps) -> TabTransformer:
+    torch.manual_seed(0)
+    config = TabularConfig(
+        num_features=NUM_COLS,
+        cat_features=CAT_COLS,
+        cat_cardinalities=[len(cat_maps[col]) for col in CAT_COLS],
+        d_model=32,
+        n_heads=4,
+        n_layers=2,
+        dim_feedforward=64,
+        dropout=0.1,
+        num_classes=3,
+    )
+    return TabTransformer(config).eval()
+
+
+@pytest.fixture
+def saved_model(tmp_path, monkeypatch):
+    """Data CSV, model and encoders saved under tmp_path instead of the repo root."""
+    data_file = str(tmp_path / "data.csv")
+    monkeypatch.setattr(risk_model, "MODEL_PATH", str(tmp_path / "model_state.pt"))
+    monkeypatch.setattr(risk_model, "ENCODERS_PATH", str(tmp_path / "encoders.json"))
+    monkeypatch.setattr(risk_prediction_transformer, "DATA_FILE", data_file)
+    monkeypatch.setattr(incremental_update, "DATA_FILE", data_file)
+    monkeypatch.setattr(incremental_update, "ENCODERS_PATH", str(tmp_path / "encoders.json"))
+    monkeypatch.setattr(incremental_update, "REPLAY_PATH", str(tmp_path / "replay_buffer.csv"))
+    monkeypatch.setattr(incremental_update, "STUDENT_PATH", str(tmp_path / "student_state.pt"))
+    monkeypatch.setattr(distill_student, "STUDENT_PATH", str(tmp_path / "student_state.pt"))
+    monkeypatch.setattr(distill_student, "MODEL_PATH", str(tmp_path / "model_state.pt"))
+    monkeypatch.setattr(distill_student, "ENCODERS_PATH", str(tmp_path / "encoders.json"))
+
+    df = generate_synthetic_data(n_samples=200, seed=0)
+    df.to_csv(data_file, index=False)
+    cat_maps, num_stats = build_encoders(df)
+    save_model_and_encoders(_model(cat_maps), cat_maps, num_stats, n_samples=len(df))
+    return df, data_file
+
+
+def test_data_csv_round_trips_after_update(saved_model):
+    df, data_file = saved_model
+    # Same columns as the data file, in a different order.
+    new_df = generate_synthetic_data(n_samples=40, seed=1)[list(reversed(df.columns))]
+
+    run_incremental_update(new_df, epochs=1, replay_size=50, seed=0)
+
+    reloaded = pd.read_csv(data_file)
+    assert list(reloaded.columns) == list(df.columns)
+    expected = pd.concat([df, new_df[df.columns]], ignore_index=True)
+    pd.testing.assert_frame_equal(reloaded, expected)
+    assert len(pd.read_csv(incremental_update.REPLAY_PATH)) == 50
+
+
+def test_unknown_risk_level_is_rejected(saved_model):
+    df, data_file = saved_model
+    new_df = generate_synthetic_data(n_samples=10, seed=1)
+    new_df.loc[[2, 5], "RiskLevel"] = ["Moderate", "Severe"]
+
+    with pytest.raises(ValueError, match="Moderate.*Severe"):
+        run_incremental_update(new_df, epochs=1, replay_size=50, seed=0)
+    assert len(pd.read_csv(data_file)) == len(df)
+
+
+def test_student_is_rejected_after_update(saved_model):
+    cat_maps, _ = build_encoders(saved_model[0])
+    student = distill_student.StudentMLP(len(NUM_COLS), [len(cat_maps[col]) for col in CAT_COLS])
+    distill_student.save_student(student, threshold=0.8)
+    assert distill_student.load_student()[1] == 0.8
+
+    run_incremental_update(generate_synthetic_data(n_samples=20, seed=1), epochs=1, replay_size=50, seed=0)
+
+    with pytest.raises(ValueError):
+        distill_student.load_student()
+
+
+def test_merge_num_stats_matches_concatenated_data():
+    old_df = generate_synthetic_data(n_samples=300, seed=2)
+    new_df = generate_synthetic_data(n_samples=75, seed=3)
+    _, old_stats = build_encoders(old_df)
+
+    merged = merge_num_stats(old_stats, len(old_df), new_df)
+
+    _, expected = build_encoders(pd.concat([old_df, new_df], ignore_index=True))
+    for col in NUM_COLS:
+        assert merged[col] == pytest.approx(expected[col], rel=1e-9)
+
+
+def test_rebase_keeps_logits_unchanged():
+    old_df = generate_synthetic_data(n_samples=300, seed=4)
+    new_df = generate_synthetic_data(n_samples=100, seed=5)
+    cat_maps, old_stats = build_encoders(old_df)
+    new_stats = merge_num_stats(old_stats, len(old_df), new_df)
+    model = _model(cat_maps)
+
+    x_num_old, x_cat, _ = encode_dataframe(old_df, cat_maps, old_stats)
+    x_num_new, _, _ = encode_dataframe(old_df, cat_maps, new_stats)
+    with torch.no_grad():
+        expected = model(x_num_old, x_cat)
+        rebase_numeric_projections(model, old_stats, new_stats)
+        actual = model(x_num_new, x_cat)
+    assert torch.allclose(actual, expected, atol=1e-4)
+
+
+def test_grow_categories_keeps_existing_rows():
+    df = generate_synthetic_data(n_samples=100, seed=6)
+    cat_maps, _ = build_encoders(df)
+    model = _model(cat_maps)
+    region = CAT_COLS.index("Region")
+    old_weight = model.cat_embeddings[region].weight.detach().clone()
+    n_regions = len(cat_maps["Region"])
+
+    new_df = df.head(3).assign(Region=["Atlantis", "Atlantis", df["Region"].iloc[0]])
+    added = grow_categories(model, cat_maps, new_df)
+
+    assert added == ["Region=Atlantis"]
+    assert cat_maps["Region"]["Atlantis"] == n_regions
+    weight = model.cat_embeddings[region].weight.detach()
+    assert weight.shape[0] == n_regions + 1
+    assert torch.equal(weight[:n_regions], old_weight)
+    assert torch.allclose(weight[n_regions], old_weight.mean(dim=0))
+    assert model.config.cat_cardinalities[region] == n_regions + 1
+
+
+def test_replay_buffer_stays_bounded_and_uniform():
+    capacity, n_seen, n_new = 50, 50, 150
+    counts = np.zeros(n_seen + n_new)
+    rng = np.random.default_rng(0)
+    for _ in range(400):
+        buffer = pd.DataFrame({"row": np.arange(n_seen)})
+        buffer = update_replay_buffer(buffer, n_seen, pd.DataFrame({"row": np.arange(n_seen, n_seen + n_new)}), capacity, rng)
+        assert len(buffer) == capacity
+        assert buffer["row"].is_unique
+        counts[buffer["row"].to_numpy()] += 1
+
+    # Every row should be kept with probability capacity / total = 0.25.
+    inclusion = counts / 400
+    assert inclusion[:n_seen].mean() == pytest.approx(0.25, abs=0.03)
+    assert inclusion[n_seen:].mean() == pytest.approx(0.25, abs=0.03)
@@ -0,0 +1,91 @@
+import gzip
+import io
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+import torch
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from report_export import CLASSES, EXPORT_COLS, export_summary, stream_export
+from risk_model import TabTransformer, TabularConfig, encode_dataframe
+from risk_prediction_transformer import build_encoders, generate_synthetic_data
+
+CAT_COLS = ["Gender", "Region", "HealthHistory"]
+
+
+def _scoring_setup(df):
+    torch.manual_seed(0)
+    cat_maps, num_stats = build_encoders(df)
+    config = TabularConfig(
+        num_features=["Age", "BMI", "HemoglobinLevel", "IncomeLevel"],
+        cat_features=CAT_COLS,
+        cat_cardinalities=[len(cat_maps[col]) for col in CAT_COLS],
+    )
+    return TabTransformer(config).eval(), cat_maps, num_stats
+
+
+def test_parquet_export_keeps_one_schema_across_chunks(tmp_path):
+    pq = pytest.importorskip("pyarrow.parquet")
+    df = generate_synthetic_data(n_samples=30, seed=0)
+    df["Age"] = df["Age"].astype(int)
+    model, cat_maps, num_stats = _scoring_setup(df)
+
+    # The second chunk has a missing Age, so pandas reads it as float while
+    # the first chunk is integer; unlabelled rows leave RiskLevel all-null.
+    source = df.copy().astype({"Age": "object"})
+    source.loc[15, "Age"] = None
+    source.loc[:14, "RiskLevel"] = None
+    path = tmp_path / "source.csv"
+    source.to_csv(path, index=False)
+
+    body = b"".join(stream_export(model, cat_maps, num_stats, fmt="parquet", chunk_size=15, source=str(path)))
+    table = pq.read_table(io.BytesIO(body))
+
+    assert table.num_rows == 30
+    assert table.column_names == EXPORT_COLS
+    assert pq.ParquetFile(io.BytesIO(body)).metadata.num_row_groups == 2
+    out = table.to_pandas()
+    assert out["RiskLevel"].iloc[:15].isna().all()
+    assert out["RiskLevel"].iloc[15:].tolist() == df["RiskLevel"].iloc[15:].tolist()
+
+
+def test_chunk_size_is_bounded():
+    df = generate_synthetic_data(n_samples=5, seed=0)
+    model, cat_maps, num_stats = _scoring_setup(df)
+    with pytest.raises(ValueError):
+        stream_export(model, cat_maps, num_stats, chunk_size=10**9)
+
+
+def test_gzipped_csv_export_matches_direct_scoring(tmp_path):
+    df = generate_synthetic_data(n_samples=50, seed=3)
+    model, cat_maps, num_stats = _scoring_setup(df)
+    path = tmp_path / "source.csv"
+    df.to_csv(path, index=False)
+
+    body = b"".join(
+        stream_export(model, cat_maps, num_stats, fmt="csv", compress=True, chunk_size=16, source=str(path))
+    )
+    out = pd.read_csv(io.BytesIO(gzip.decompress(body)))
+
+    x_num, x_cat, _ = encode_dataframe(df, cat_maps, num_stats)
+    with torch.no_grad():
+        probs = torch.softmax(model(x_num, x_cat), dim=1).numpy()
+    predicted = np.asarray(CLASSES)[probs.argmax(axis=1)]
+
+    assert list(out.columns) == EXPORT_COLS
+    assert len(out) == len(df)
+    pd.testing.assert_frame_equal(out[df.columns.tolist()], df, check_dtype=False)
+    assert out["PredictedRisk"].tolist() == predicted.tolist()
+    for i, cls in enumerate(CLASSES):
+        assert np.allclose(out[f"Prob{cls}"], probs[:, i] * 100.0, atol=0.01)
+
+    summary = export_summary(model, cat_maps, num_stats, chunk_size=16, source=str(path))
+    assert summary["total"] == len(df)
+    for cls in CLASSES:
+        assert summary["labelled"][cls] == int((df["RiskLevel"] == cls).sum())
+        assert summary["predicted"][cls] == int((predicted == cls).sum())
+    assert summary["agreement_rate"] == pytest.approx(float((predicted == df["RiskLevel"].to_numpy()).mean()))
@@ -0,0 +1,166 @@
+import asyncio
+import os
+import sys
+import time
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from scoring_cluster import (
+    MSG_PING,
+    MSG_PONG,
+    MSG_RESULT,
+    MSG_SCORE,
+    MultiplexedConnection,
+    Router,
+    decode_result,
+    encode_frame,
+    pack_batch,
+    read_frame,
+    start_server,
+)
+
+
+class FakeWorker:
+    """
+    Answers pings and scores every row as [1, 0, 0]. With hang=True it stops
+    replying to scoring requests; with mute=True it stops replying at all.
+    """
+
+    def __init__(self, address: str, hang: bool = False):
+        self.address = address
+        self.hang = hang
+        self.mute = False
+        self.scored = 0
+
+    async def handle(self, reader, writer) -> None:
+        try:
+            while True:
+                frame = await read_frame(reader)
+                if self.mute:
+                    continue
+                if frame[0] == MSG_PING:
+                    writer.write(encode_frame(MSG_PONG, frame[1]))
+                elif frame[0] == MSG_SCORE and not self.hang:
+                    self.scored += 1
+                    probs = np.zeros((frame[2], 3), dtype="<f4")
+                    probs[:, 0] = 1.0
+                    writer.write(encode_frame(MSG_RESULT, frame[1], frame[2], 3, 0, probs.tobytes()))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+def _score_frame(n_rows: int = 4):
+    n_rows, a, b, body = pack_batch(np.zeros((n_rows, 4), dtype=np.float32), np.zeros((n_rows, 3), dtype=np.int64))
+    return (MSG_SCORE, 0, n_rows, a, b, body)
+
+
+async def _router_with(workers, **kwargs):
+    servers = [await start_server(w.address, w.handle) for w in workers]
+    router = Router([w.address for w in workers], health_interval=0.05, health_timeout=0.2, **kwargs)
+    await asyncio.gather(*(router._check(w) for w in router.workers))
+    return router, servers
+
+
+def test_request_timeout_retries_on_another_worker(tmp_path):
+    async def scenario():
+        hung = FakeWorker(f"unix:{tmp_path}/hung.sock", hang=True)
+        good = FakeWorker(f"unix:{tmp_path}/good.sock")
+        router, servers = await _router_with([hung, good], request_timeout=0.2)
+        hung_handle = router.workers[0]
+        # With no outstanding requests the first pick is the first worker.
+        reply = await asyncio.wait_for(router.score(_score_frame()), 2.0)
+        assert reply[0] == MSG_RESULT
+        assert decode_result(reply).shape == (4, 3)
+        assert good.scored == 1
+        assert not hung_handle.available
+        # The timed-out request may still be queued on the worker, so it keeps counting.
+        assert hung_handle.conn.pending == {}
+        assert hung_handle.outstanding == 1
+        for server in servers:
+            server.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_health_check_fails_pending_requests(tmp_path):
+    async def scenario():
+        worker = FakeWorker(f"unix:{tmp_path}/w.sock")
+        router, servers = await _router_with([worker])
+        handle = router.workers[0]
+        conn = handle.conn
+        worker.mute = True
+        pending = asyncio.ensure_future(conn.request(MSG_SCORE, *_score_frame(1)[2:]))
+        await asyncio.sleep(0.01)
+        assert handle.outstanding == 1
+
+        await router._check(handle)
+        assert not handle.healthy
+        assert handle.conn is None
+        with pytest.raises(ConnectionError):
+            await asyncio.wait_for(pending, 1.0)
+        assert conn.pending == {}
+        for server in servers:
+            server.close()
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_request_is_removed_from_pending(tmp_path):
+    async def scenario():
+        worker = FakeWorker(f"unix:{tmp_path}/w.sock", hang=True)
+        server = await start_server(worker.address, worker.handle)
+        conn = await MultiplexedConnection.connect(worker.address)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(conn.request(MSG_SCORE, *_score_frame(1)[2:]), 0.05)
+        assert conn.pending == {}
+        assert conn.in_flight == 1
+        frame = await conn.request(MSG_PING)
+        assert frame[0] == MSG_PONG
+        await conn.close()
+        server.close()
+
+    asyncio.run(scenario())
+
+
+def test_hung_worker_stays_out_of_rotation_until_a_probe_succeeds(tmp_path):
+    async def scenario():
+        hung = FakeWorker(f"unix:{tmp_path}/hung.sock", hang=True)
+        good = FakeWorker(f"unix:{tmp_path}/good.sock")
+        router, servers = await _router_with([hung, good], request_timeout=0.3)
+        hung_handle = router.workers[0]
+        health = asyncio.ensure_future(router.health_loop())
+        try:
+            # The first request lands on the hung worker and is retried after the timeout.
+            await asyncio.wait_for(router.score(_score_frame()), 2.0)
+            assert hung_handle.probe is not None
+
+            # The hung worker keeps answering pings, but later requests must skip it.
+            start = time.perf_counter()
+            for _ in range(8):
+                await asyncio.sleep(0.06)
+                reply = await router.score(_score_frame())
+                assert reply[0] == MSG_RESULT
+            assert time.perf_counter() - start < 8 * 0.06 + 0.3
+            assert good.scored == 9
+            assert not hung_handle.available
+
+            # Once it scores again, the probe succeeds and it rejoins.
+            hung.hang = False
+            for _ in range(40):
+                await asyncio.sleep(0.05)
+                if hung_handle.available:
+                    break
+            assert hung_handle.available
+            assert hung_handle.probe is None
+        finally:
+            health.cancel()
+            for server in servers:
+                server.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+import os
+import sys
+
+import torch
+import torch.nn as nn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from distill_student import TieredPredictor
+
+TEACHER_PROBS = torch.tensor([0.1, 0.2, 0.7])
+
+
+class _LogitsFromInput(nn.Module):
+    """Student stand-in whose logits are the first three numeric inputs."""
+
+    def forward(self, x_num: torch.Tensor, x_cat: torch.Tensor) -> torch.Tensor:
+        return x_num[:, :3]
+
+
+class _ConstantTeacher(nn.Module):
+    """Teacher stand-in that records which rows it was asked to score."""
+
+    def __init__(self):
+        super().__init__()
+        self.seen = []
+
+    def forward(self, x_num: torch.Tensor, x_cat: torch.Tensor) -> torch.Tensor:
+        self.seen.append(x_num.clone())
+        return TEACHER_PROBS.log().expand(x_num.size(0), 3)
+
+
+def _predictor(threshold: float):
+    teacher = _ConstantTeacher()
+    return TieredPredictor(_LogitsFromInput(), teacher, threshold=threshold), teacher
+
+
+def _inputs(rows):
+    x_num = torch.tensor(rows, dtype=torch.float32)
+    x_cat = torch.zeros(len(rows), 3, dtype=torch.long)
+    return x_num, x_cat
+
+
+def test_low_confidence_rows_fall_back_to_teacher():
+    predictor, teacher = _predictor(threshold=0.9)
+    # Row 0 and 2 are confident (top prob ~1.0), row 1 is uniform (1/3).
+    x_num, x_cat = _inputs([[20.0, 0.0, 0.0, 0.0], [0.0, 0.0, 0.0, 1.0], [0.0, 0.0, 20.0, 2.0]])
+    probs, from_student = predictor.predict_proba(x_num, x_cat)
+
+    assert from_student.tolist() == [True, False, True]
+    assert len(teacher.seen) == 1
+    assert torch.equal(teacher.seen[0], x_num[1:2])
+    assert torch.allclose(probs[1], TEACHER_PROBS)
+    assert probs[0].argmax().item() == 0
+    assert probs[2].argmax().item() == 2
+
+
+def test_teacher_not_called_when_student_is_confident():
+    predictor, teacher = _predictor(threshold=0.9)
+    x_num, x_cat = _inputs([[20.0, 0.0, 0.0, 0.0], [0.0, 20.0, 0.0, 0.0]])
+    _, from_student = predictor.predict_proba(x_num, x_cat)
+
+    assert bool(from_student.all())
+    assert teacher.seen == []
+
+
+def test_threshold_boundary_is_served_by_student():
+    # softmax([0, 0, -inf]) is exactly [0.5, 0.5, 0].
+    x_num, x_cat = _inputs([[0.0, 0.0, float("-inf"), 0.0]])
+
+    predictor, teacher = _predictor(threshold=0.5)
+    probs, from_student = predictor.predict_proba(x_num, x_cat)
+    assert from_student.tolist() == [True]
+    assert teacher.seen == []
+    assert torch.allclose(probs[0], torch.tensor([0.5, 0.5, 0.0]))
+
+    predictor, teacher = _predictor(threshold=0.5 + 1e-6)
+    probs, from_student = predictor.predict_proba(x_num, x_cat)
+    assert from_student.tolist() == [False]
+    assert torch.allclose(probs[0], TEACHER_PROBS)